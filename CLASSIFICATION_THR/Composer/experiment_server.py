@@ -11,13 +11,14 @@ Class:
 - BaseExperimentServer: Manages the lifecycle of an AI inference experiment, including setup, execution, and response handling.
 
 Methods:
-- __init__(self, logger): Initializes the BaseExperimentServer instance and calls the method to set experiment configurations.
+- __init__(self, logger, model_path=None): Initializes the BaseExperimentServer instance and calls the method to set experiment configurations.
 - set_experiment_configs(self): Sets up configurations specific to the particular experiment.
 - send_response(self, encoded_output): Sends a HTTP response with the encoded output.
 - decode_input(self, indata): Decodes the input data from the request.
 - create_and_preprocess(self, decoded_input, run_total): Preprocesses the decoded input data, creating a dataset for the experiment.
 - postprocess(self, exp_output, run_total): Postprocesses the experiment output.
 - encode_output(self, output): Encodes the experiment output for sending in a response.
+- cleanup_request(self): Removes the temporary dataset directory of an abandoned request.
 
 These methods should be EDITED according to the needs of the specific experiment.
 """
@@ -25,7 +26,6 @@ These methods should be EDITED according to the needs of the specific experiment
 import os
 import cv2
 import numpy as np
-import tensorflow as tf
 import time
 import json
 import zipfile
@@ -37,14 +37,15 @@ import tempfile
 
 # Custom module
 import base_server
+import utils
 
 class BaseExperimentServer(base_server.BaseServer):
-    def __init__(self, logger):
+    def __init__(self, logger, model_path=None):
         """
         Initializes the BaseExperimentServer instance.
         Sets up the experiment configurations and initializes the BaseServer.
         """
-        super().__init__(logger)
+        super().__init__(logger, model_path=model_path)
         self.experiment_configs = {}
         self.set_experiment_configs()
     
@@ -59,9 +60,6 @@ class BaseExperimentServer(base_server.BaseServer):
         with open(CLASS_INDEX_JSON) as f:
             self.experiment_configs['CLASS_INDEX'] = json.load(f)
         
-        # Create a temporary directory for storing the dataset.
-        self.experiment_configs['temp_dataset_dir'] = tempfile.mkdtemp()
-        
         # Set image size and shape configurations.
         self.experiment_configs['image_size'] = (224, 224)
         self.experiment_configs['image_shape'] = (self.server_configs['BATCH_SIZE'], 224, 224, 3)
@@ -76,20 +74,40 @@ class BaseExperimentServer(base_server.BaseServer):
             tuple: Decoded input (whichever format) (in this implementation a directory of images) and the total number of data.
         decoded_input becomes the input for create_and_preprocess which also exists on experiment_server.py.
         """
-        # Extract the zip contents to a temporary dataset directory.
+        # Extract the zip contents to a temporary dataset directory, one per request, kept in the request_state
+        # so that consecutive requests can be processed concurrently in pipelined mode.
+        self.request_state['temp_dataset_dir'] = tempfile.mkdtemp()
         zip_ref = zipfile.ZipFile(io.BytesIO(indata), 'r')
-        zip_ref.extractall(self.experiment_configs['temp_dataset_dir'])
+        zip_ref.extractall(self.request_state['temp_dataset_dir'])
         zip_ref.close()
         
         # Get the folder name containing the extracted images.
-        foldername = os.path.join(self.experiment_configs['temp_dataset_dir'], os.listdir(self.experiment_configs['temp_dataset_dir'])[0])
+        foldername = os.path.join(self.request_state['temp_dataset_dir'], os.listdir(self.request_state['temp_dataset_dir'])[0])
         
         # List and sort all image files in the folder.
         listimage = os.listdir(foldername)
         listimage.sort()
         
-        self.experiment_configs['listimage'] = listimage
+        self.request_state['listimage'] = listimage
         runTotal = len(listimage)
+
+        # With the result cache enabled, look up every image by the hash of its file (and the model and its hot swaps). The cached images are removed
+        # from the folder, so only the cache misses are preprocessed and executed; postprocess reassembles the outputs.
+        if self.result_cache is not None:
+            image_keys = []
+            cached_outputs = {}
+            for i, image_name in enumerate(listimage):
+                image_path = os.path.join(foldername, image_name)
+                with open(image_path, 'rb') as f:
+                    image_keys.append(utils.content_key(('image', self.server_configs['MODEL_PATH'], self.model_generation), f.read()))
+                cached_output = self.result_cache.get(image_keys[i])
+                if cached_output is not None:
+                    cached_outputs[i] = cached_output
+                    os.remove(image_path)
+            self.request_state['image_keys'] = image_keys
+            self.request_state['cached_outputs'] = cached_outputs
+            runTotal = len(listimage) - len(cached_outputs)
+            self.log("Result cache: %s of %s images cached", len(cached_outputs), len(listimage))
         decoded_input = foldername
         
         return decoded_input, runTotal
@@ -100,15 +118,42 @@ class BaseExperimentServer(base_server.BaseServer):
         Gets decoded_input from decode_input() and outputs dataset.
         dataset NEEDS to be:
         a) an numpy.array on Latency Server Mode (self.server_configs['SERVER_MODE'] == 0).
-        b) a tf.data.Dataset  on Throughput Server Mode (self.server_configs['SERVER_MODE'] == 1).
+        b) a tf.data.Dataset  on Throughput Server Mode (self.server_configs['SERVER_MODE'] == 1), or an iterator of numpy batches
+           if self.server_configs['NUMPY_DATASET'] is set by the {Pair}Server (CPU, ARM, GPU, AGX).
 
         Args:
             decoded_input (str): Directory containing the extracted images.
             run_total (int): Total number of images.
         
         Returns:
-            dataset: Preprocessed dataset ready for inference.
+            dataset: Preprocessed dataset ready for inference, or None if every image was served from the result cache.
         """
+        if run_total == 0:
+            return None
+
+        if self.server_configs['NUMPY_DATASET']:
+            # OpenCV/NumPy equivalent of the TensorFlow pipeline below, so that the pair never imports TensorFlow.
+            image_paths = [os.path.join(decoded_input, image_name) for image_name in sorted(os.listdir(decoded_input))]
+            height, width = self.experiment_configs['image_size']
+            # ResNet50 preprocessing ('caffe' mode): BGR channel order, zero-centered by the ImageNet mean.
+            bgr_mean = np.array([103.939, 116.779, 123.68], dtype=np.float32)
+
+            def numpy_batches():
+                # Decode and preprocess one batch at a time, as the batches are consumed by experiment_multiple.
+                for start in range(0, len(image_paths), self.server_configs['BATCH_SIZE']):
+                    batch_paths = image_paths[start:start + self.server_configs['BATCH_SIZE']]
+                    batch = np.empty(shape=(len(batch_paths), height, width, 3), dtype=np.float32)
+                    for i, image_path in enumerate(batch_paths):
+                        image = cv2.imread(image_path, cv2.IMREAD_COLOR)  # Already in BGR order
+                        batch[i] = cv2.resize(image, (width, height), interpolation=cv2.INTER_LINEAR)
+                    batch -= bgr_mean
+                    yield self.platform_preprocess(batch)
+
+            dataset = numpy_batches()
+            return dataset
+
+        import tensorflow as tf  # Only the TensorFlow-based pairs build a tf.data.Dataset
+
         def preprocess(image):
             # Preprocess images using ResNet50 preprocessing function.
             image = tf.keras.applications.resnet50.preprocess_input(image)
@@ -171,6 +216,19 @@ class BaseExperimentServer(base_server.BaseServer):
         platform_output = self.platform_postprocess(exp_output)
         probs = softmax(platform_output)
         preds.extend(decode_predictions(probs, top=5))
+
+        # Cache the outputs of the executed images and reassemble them with the cached ones, in the listimage order.
+        if self.result_cache is not None:
+            cached_outputs = self.request_state['cached_outputs']
+            executed_outputs = iter(preds)
+            preds = []
+            for i, image_key in enumerate(self.request_state['image_keys']):
+                if i in cached_outputs:
+                    preds.append(cached_outputs[i])
+                else:
+                    pred = next(executed_outputs)
+                    self.result_cache.put(image_key, pred, len(json.dumps(pred)))
+                    preds.append(pred)
         
         output = preds
         return output
@@ -188,13 +246,19 @@ class BaseExperimentServer(base_server.BaseServer):
         # Convert the postprocessed output into a dictionary.
         out_dict = {}
         for i in range(len(output)):
-            out_dict[self.experiment_configs['listimage'][i]] = output[i]
+            out_dict[self.request_state['listimage'][i]] = output[i]
         
         # Cleanup by removing the temporary dataset directory.
-        shutil.rmtree(self.experiment_configs['temp_dataset_dir'], ignore_errors=True)
+        shutil.rmtree(self.request_state['temp_dataset_dir'], ignore_errors=True)
         
         encoded_output = out_dict
         return encoded_output
+
+    def cleanup_request(self):
+        """
+        Removes the temporary dataset directory of a request abandoned before encode_output (e.g., after its deadline expired).
+        """
+        shutil.rmtree(self.request_state.get('temp_dataset_dir', ''), ignore_errors=True)
         
     def send_response(self, encoded_output):
         """
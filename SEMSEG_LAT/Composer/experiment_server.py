@@ -11,7 +11,7 @@ Class:
 - BaseExperimentServer: Manages the lifecycle of an AI inference experiment, including setup, execution, and response handling.
 
 Methods:
-- __init__(self, logger): Initializes the BaseExperimentServer instance and calls the method to set experiment configurations.
+- __init__(self, logger, model_path=None): Initializes the BaseExperimentServer instance and calls the method to set experiment configurations.
 - set_experiment_configs(self): Sets up configurations specific to the particular experiment.
 - send_response(self, encoded_output): Sends a HTTP response with the encoded output.
 - decode_input(self, indata): Decodes the input data from the request.
@@ -25,7 +25,6 @@ These methods should be EDITED according to the needs of the specific experiment
 import os
 import cv2
 import numpy as np
-import tensorflow as tf
 import time
 import json
 import zipfile
@@ -39,12 +38,12 @@ import tempfile
 import base_server
 
 class BaseExperimentServer(base_server.BaseServer):
-    def __init__(self, logger):
+    def __init__(self, logger, model_path=None):
         """
         Initializes the BaseExperimentServer instance.
         Sets up the experiment configurations and initializes the BaseServer.
         """
-        super().__init__(logger)
+        super().__init__(logger, model_path=model_path)
         self.experiment_configs = {}
         self.set_experiment_configs()
     
@@ -13,11 +13,12 @@ Classes:
 - AgxServer: Inherits from BaseExperimentServer and implements AGX-specific initialization and inference methods.
 
 Methods:
-- __init__(self, logger): Initializes the AgxServer instance, sets up the logger, initializes the kernel, and performs a warm-up run.
+- __init__(self, logger, model_path=None): Initializes the AgxServer instance, sets up the logger, initializes the kernel, and performs a warm-up run.
 - init_kernel(self): Sets up the ONNX Runtime inference session, configures execution providers, and loads the model.
 - warm_up(self): Performs a warm-up run by passing a dummy input through the ONNX Runtime session.
+- resize_batch(self, batch_size): Sets BATCH_SIZE and warms up again, if the ONNX model has a dynamic batch dimension.
 - experiment_single(self, input, run_total=1): Executes a single experiment, taking a numpy array as input and returning a numpy array as output.
-- experiment_multiple(self, dataset, run_total): Executes multiple experiments, taking a tf.data.Dataset as input and returning a numpy array as output.
+- experiment_multiple(self, dataset, run_total): Executes multiple experiments, taking an iterator of numpy batches as input and returning a numpy array as output.
 - platform_preprocess(self, data): Placeholder for AI-framework/platform pair-specific preprocessing.
 - platform_postprocess(self, data): Placeholder for AI-framework/platform pair-specific postprocessing.
 
@@ -27,7 +28,6 @@ DO NOT edit this file directly.
 import os
 import time
 import numpy as np
-import tensorflow as tf
 import onnxruntime as ort
 import experiment_server
 
@@ -36,13 +36,15 @@ class AgxServer(experiment_server.BaseExperimentServer):
     AGX-specific server implementation for running ONNX Runtime models.
     Inherits from BaseExperimentServer and implements AGX-specific initialization and inference methods.
     """
-    def __init__(self, logger):
+    def __init__(self, logger, model_path=None):
         """Initialize the AgxServer instance, set up the logger, initialize the kernel, and perform a warm-up run."""
-        super().__init__(logger)
+        super().__init__(logger, model_path=model_path)
+        self.server_configs['NUMPY_DATASET'] = True  # Takes NumPy batches, without TensorFlow
         self.sess = None
         self.server_configs['CALIBRATION'] = os.environ['CALIBRATION']
         self.server_configs['providers'] = None
         self.server_configs['input_name'] = None
+        self.server_configs['dynamic_batch'] = None
         self.init_kernel()
         self.warm_up()
     
@@ -77,17 +79,21 @@ class AgxServer(experiment_server.BaseExperimentServer):
         # Store input name and shape in server configurations
         self.server_configs['input_name'] = self.sess.get_inputs()[0].name
         self.server_configs['input_shape'] = self.sess.get_inputs()[0].shape
+        # A dynamic batch dimension (e.g., 'N') takes BATCH_SIZE
+        self.server_configs['dynamic_batch'] = not isinstance(self.server_configs['input_shape'][0], int)
+        if self.server_configs['dynamic_batch']:
+            self.server_configs['input_shape'] = [self.server_configs['BATCH_SIZE']] + list(self.server_configs['input_shape'][1:])
 
         # Log details for debugging
-        self.log(f"Providers: {self.sess.get_providers()}")
-        self.log(f"Provider Options: {self.sess.get_provider_options()}")
-        self.log(f"Session Options: {self.sess.get_session_options()}")
-        self.log(f"Input Name: {self.server_configs['input_name']}")
-        self.log(f"Input Shape: {self.server_configs['input_shape']}")
+        self.log("Providers: %s", self.sess.get_providers())
+        self.log("Provider Options: %s", self.sess.get_provider_options())
+        self.log("Session Options: %s", self.sess.get_session_options())
+        self.log("Input Name: %s", self.server_configs['input_name'])
+        self.log("Input Shape: %s", self.server_configs['input_shape'])
 
         end = time.perf_counter()
         self.once_timings['init'] = end - start
-        self.log(f"Initialize time: {self.once_timings['init'] * 1000:.2f} ms")
+        self.log("Initialize time: %.2f ms", self.once_timings['init'] * 1000)
     
     def warm_up(self):
         """
@@ -97,14 +103,26 @@ class AgxServer(experiment_server.BaseExperimentServer):
         start = time.perf_counter()
 
         # Create a dummy input tensor filled with zeros
-        x_dummy = tf.zeros(shape=self.server_configs['input_shape'], dtype=tf.float32).numpy()
+        x_dummy = np.zeros(shape=self.server_configs['input_shape'], dtype=np.float32)
 
         # Run the dummy input through the ONNX Runtime session
         _ = self.sess.run([], {self.server_configs['input_name']: x_dummy})
 
         end = time.perf_counter()
         self.once_timings['warm_up'] = end - start
-        self.log(f"Warmup time: {self.once_timings['warm_up'] * 1000:.2f} ms")
+        self.log("Warmup time: %.2f ms", self.once_timings['warm_up'] * 1000)
+
+    def resize_batch(self, batch_size):
+        """
+        Set BATCH_SIZE and warm up again for it, used by BaseServer.autotune_batch_size.
+        Only a model exported with a dynamic batch dimension runs with a different batch size; the session is reused.
+        """
+        assert self.server_configs['dynamic_batch'] or batch_size == self.server_configs['input_shape'][0], \
+            f"The ONNX model is exported for a batch size of {self.server_configs['input_shape'][0]}, got {batch_size}"
+        self.server_configs['BATCH_SIZE'] = batch_size
+        self.inference_metrics['batch_size'] = batch_size
+        self.server_configs['input_shape'] = [batch_size] + list(self.server_configs['input_shape'][1:])
+        self.warm_up()
 
     def experiment_single(self, input, run_total=1):
         """
@@ -119,35 +137,14 @@ class AgxServer(experiment_server.BaseExperimentServer):
         """
         Execute the experiment for multiple input data.
         Works only in Throughput Server Mode (self.server_configs['SERVER_MODE'] == 1).
-        Takes a tf.data.Dataset as input and returns a numpy array as output.
+        Takes an iterator of numpy batches as input and returns a numpy array as output.
+        The batches are executed by BaseServer.execute_batches.
         """
-        output_list = []
-        iterations = run_total // self.server_configs['BATCH_SIZE']
-        remainder_iteration = 1 if iterations * self.server_configs['BATCH_SIZE'] != run_total else 0
-
-        # Iterate through the dataset, batching data and feeding it to the model
-        for i, element in enumerate(dataset.take(iterations + remainder_iteration)):
-            x_test = element
-            if i == iterations:  # Process any remainder data in the last iteration
-                x_input = tf.zeros(shape=self.server_configs['input_shape'])
-                x_input_list = tf.unstack(x_input)
-                x_input_list[0:x_test.shape[0]] = x_test[:]
-                x_input = tf.stack(x_input_list).numpy()
-            else:
-                x_input = x_test.numpy()
-
-            # Run the model and append results to output list
-            output_data = self.sess.run([], {self.server_configs['input_name']: x_input})[0]
-            valid_outputs = x_test.shape[0] if i == iterations else self.server_configs['BATCH_SIZE']
-            output_list.append(output_data[0:valid_outputs, :])
-
-        # Concatenate all individual outputs to form a single numpy array
-        concat_start = time.perf_counter()
-        exp_output = np.concatenate(output_list, axis=0)
-        concat_end = time.perf_counter()
-
-        self.log(f"Concat output time: {(concat_end - concat_start) * 1000:.2f} ms")
-        return exp_output
+        def run_batch(x_input):
+            # Run the model on one batch
+            return self.sess.run([], {self.server_configs['input_name']: x_input})[0]
+
+        return self.execute_batches(dataset=dataset, run_total=run_total, run_batch=run_batch)
 
     def platform_preprocess(self, data):
         """Preprocess the input, specific to the platform requirement, not the experiment ones. Used in create_and_preprocess as the last step."""
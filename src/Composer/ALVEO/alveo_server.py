@@ -13,7 +13,7 @@ Classes:
 - AlveoServer: Inherits from BaseExperimentServer and implements ALVEO-specific initialization and inference methods.
 
 Methods:
-- __init__(self, logger): Initializes the AlveoServer instance, sets up the logger, decides the number of threads based on the batch size and the native batch sizes of the selected device, initializes the kernel, and performs a warm-up run.
+- __init__(self, logger, model_path=None): Initializes the AlveoServer instance, sets up the logger, decides the number of threads based on the batch size and the native batch sizes of the selected device, initializes the kernel, and performs a warm-up run.
 - init_kernel(self): Sets up the Vitis AI Runner, loads the model, creates the DPU runners, and determines input and output dimensions and scales.
 - warm_up(self): Performs a warm-up run using a dummy input to ensure the DPU runners are ready.
 - decide_num_threads(self): Decides the number of threads based on the batch size and the native batch sizes of the selected device.
@@ -43,9 +43,16 @@ class AlveoServer(experiment_server.BaseExperimentServer):
     ALVEO-specific server implementation for running Vitis AI models.
     Inherits from BaseExperimentServer and implements Alveo-specific initialization and inference methods.
     """
-    def __init__(self, logger):
+    def __init__(self, logger, model_path=None):
         """Initialize the AlveoServer instance, set up the logger, decide the number of threads, initialize the kernel, and perform a warm-up run."""
-        super().__init__(logger)
+        super().__init__(logger, model_path=model_path)
+        # experiment_single runs a single native batch on one DPU runner, so it cannot take a merged BATCH_SIZE batch
+        assert not self.server_configs['DYNAMIC_BATCHING'], 'Dynamic batching is not supported by AlveoServer'
+        # The DPU threads are decided once from BATCH_SIZE and the native batch size of the device
+        assert not self.server_configs['BATCH_AUTOTUNE'], 'Batch size autotuning is not supported by AlveoServer'
+        # experiment_multiple splits a tf.data.Dataset, so the synthetic batches of the steady-state warm-up cannot be used
+        assert not (self.server_configs['SERVER_MODE'] == 1 and self.server_configs['WARM_UP_MAX_ITERATIONS'] > 0 and not self.server_configs['WARM_UP_SAMPLE']), \
+            'The steady-state warm-up of AlveoServer in Throughput Server Mode needs WARM_UP_SAMPLE'
         self.all_dpu_runners = []
         self.subgraphs = None
         self.server_configs['input_scale'] = None
@@ -106,14 +113,14 @@ class AlveoServer(experiment_server.BaseExperimentServer):
         self.server_configs['output_ndim'] = tuple(self.all_dpu_runners[0].get_output_tensors()[0].dims)
 
         # Logging for debugging
-        self.log(f"Input Scale: {self.server_configs['input_scale']}")
-        self.log(f"Output Scale: {self.server_configs['output_scale']}")
-        self.log(f"Input Dimensions: {self.server_configs['input_ndim']}")
-        self.log(f"Output Dimensions: {self.server_configs['output_ndim']}")
+        self.log("Input Scale: %s", self.server_configs['input_scale'])
+        self.log("Output Scale: %s", self.server_configs['output_scale'])
+        self.log("Input Dimensions: %s", self.server_configs['input_ndim'])
+        self.log("Output Dimensions: %s", self.server_configs['output_ndim'])
 
         end = time.perf_counter()
         self.once_timings['init'] = end - start
-        self.log(f"Initialize time: {self.once_timings['init'] * 1000:.2f} ms")
+        self.log("Initialize time: %.2f ms", self.once_timings['init'] * 1000)
     
     def warm_up(self):
         """
@@ -139,7 +146,7 @@ class AlveoServer(experiment_server.BaseExperimentServer):
 
         end = time.perf_counter()
         self.once_timings['warm_up'] = end - start
-        self.log(f"Warmup time: {self.once_timings['warm_up'] * 1000:.2f} ms")
+        self.log("Warmup time: %.2f ms", self.once_timings['warm_up'] * 1000)
     
     def decide_num_threads(self):
         """Decide the number of threads based on batch size and device's native batch sizes."""
@@ -208,7 +215,7 @@ class AlveoServer(experiment_server.BaseExperimentServer):
         exp_output = np.concatenate(output_list, axis=0)
         concat_end = time.perf_counter()
 
-        self.log(f"Concat output time: {(concat_end - concat_start) * 1000:.2f} ms")
+        self.log("Concat output time: %.2f ms", (concat_end - concat_start) * 1000)
         return exp_output
 
     def platform_preprocess(self, data):
@@ -233,7 +240,7 @@ class AlveoServer(experiment_server.BaseExperimentServer):
         Takes a tf.data.Dataset as input, adds the outputs to the output_list (List of numpy arrays).
         """
         # Log thread-specific details for debugging
-        self.log(f"id: {id}, start: {start_output}, batch: {self.server_configs['native_batch_sizes'][self.server_configs['DEVICE']]}, num_of_data: {num_of_data}")
+        self.log("id: %s, start: %s, batch: %s, num_of_data: %s", id, start_output, self.server_configs['native_batch_sizes'][self.server_configs['DEVICE']], num_of_data)
 
         outputData = []
         iterations = num_of_data // self.server_configs['native_batch_sizes'][self.server_configs['DEVICE']]
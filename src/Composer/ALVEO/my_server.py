@@ -5,7 +5,7 @@ Affiliations: Microlab@NTUA, VLSILab@UPatras
 This module defines the MyServer class, which inherits from the {Pair}Server class defined in the {pair}_server module, depending on the target AI-framework/platform pair.
 
 Methods:
-- __init__(self, logger): Initializes the MyServer instance, sets up the logger, and calls the method to set experiment configurations.
+- __init__(self, logger, model_path=None): Initializes the MyServer instance, sets up the logger, and calls the method to set experiment configurations.
 
 DO NOT edit this file directly.
 """
@@ -14,5 +14,5 @@ DO NOT edit this file directly.
 import alveo_server
 
 class MyServer(alveo_server.AlveoServer):
-    def __init__(self, logger):
-        super().__init__(logger)
\ No newline at end of file
+    def __init__(self, logger, model_path=None):
+        super().__init__(logger, model_path=model_path)
\ No newline at end of file
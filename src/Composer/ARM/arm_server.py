@@ -13,11 +13,13 @@ Classes:
 - ArmServer: Inherits from BaseExperimentServer and implements ARM-specific initialization and inference methods.
 
 Methods:
-- __init__(self, logger): Initializes the ArmServer instance, sets up the logger, initializes the kernel, and performs a warm-up run.
-- init_kernel(self): Sets up the TensorFlow Lite interpreter, resizes input tensor according to batch size, and allocates tensors.
-- warm_up(self): Performs a warm-up run by passing a dummy input through the TensorFlow Lite interpreter.
+- __init__(self, logger, model_path=None): Initializes the ArmServer instance, sets up the logger, initializes the kernel, and performs a warm-up run.
+- init_kernel(self): Sets up the TensorFlow Lite interpreters (NUM_INTERPRETERS in Throughput Server Mode), resizes input tensor according to batch size, and allocates tensors.
+- warm_up(self): Performs a warm-up run by passing a dummy input through the TensorFlow Lite interpreters.
+- resize_threads(self, num_threads): Sets NUM_THREADS, creates new interpreters and warms them up, for the thread autotuning.
+- run_interpreter(self, interpreter, x_input, copy_output): Runs an interpreter on one input through views of its input and output tensors.
 - experiment_single(self, input, run_total=1): Executes a single experiment, taking a numpy array as input and returning a numpy array as output.
-- experiment_multiple(self, dataset, run_total): Executes multiple experiments, taking a tf.data.Dataset as input and returning a numpy array as output.
+- experiment_multiple(self, dataset, run_total): Executes multiple experiments, taking an iterator of numpy batches as input and returning a numpy array as output. The batches are distributed over the pool of interpreters.
 - platform_preprocess(self, data): Executes preprocessing steps on the data required by the AI-framework/platform pair implementation.
 - platform_postprocess(self, data): Executes postprocessing steps on the data required by the AI-framework/platform pair implementation.
 
@@ -26,20 +28,38 @@ DO NOT edit this file directly.
 
 import os
 import time
+import queue
 import numpy as np
-import tensorflow as tf
+try:
+    # The standalone TensorFlow Lite runtime, which does not import TensorFlow
+    from tflite_runtime.interpreter import Interpreter
+except ImportError:
+    import tensorflow as tf
+    Interpreter = tf.lite.Interpreter
 import experiment_server
+import utils
 
 class ArmServer(experiment_server.BaseExperimentServer):
     """
     ARM-specific server implementation for running TensorFlow Lite models.
     Inherits from BaseExperimentServer and implements ARM-specific initialization and inference methods.
     """
-    def __init__(self, logger):
+    def __init__(self, logger, model_path=None):
         """Initialize the ArmServer instance, set up the logger, initialize the kernel, and perform a warm-up run."""
-        super().__init__(logger)
+        super().__init__(logger, model_path=model_path)
+        self.server_configs['NUMPY_DATASET'] = True  # Takes NumPy batches, without TensorFlow
         self.interpreter = None
+        self.interpreters = []  # The pool of interpreters of experiment_multiple, self.interpreter is the first one
+        self.idle_interpreters = None
         self.server_configs['NUM_THREADS'] = int(os.environ['NUM_THREADS'])
+        # In Throughput Server Mode, the batches run concurrently on NUM_INTERPRETERS interpreters of NUM_THREADS threads each
+        self.server_configs['NUM_INTERPRETERS'] = int(os.getenv('NUM_INTERPRETERS', '1')) if self.server_configs['SERVER_MODE'] == 1 else 1
+        assert self.server_configs['NUM_INTERPRETERS'] > 0, f"NUM_INTERPRETERS should be a positive integer, got {self.server_configs['NUM_INTERPRETERS']}"
+        self.server_configs['PARALLEL_BATCHES'] = self.server_configs['NUM_INTERPRETERS']
+        # Return the output of experiment_single as a view of the output tensor, which is valid until the next invoke.
+        # In pipelined mode the next request may run before the previous one is postprocessed, so the output is copied.
+        self.server_configs['ZERO_COPY_OUTPUT'] = utils.strtobool(os.getenv('TFLITE_ZERO_COPY_OUTPUT', 'True')) \
+            and not utils.strtobool(os.getenv('PIPELINED_INFERENCE', 'False'))
         self.server_configs['input_details'] = None
         self.server_configs['output_details'] = None
         self.init_kernel()
@@ -48,108 +68,118 @@ class ArmServer(experiment_server.BaseExperimentServer):
     def init_kernel(self):
         """
         Initialize one-time AI-framework/platform pair-specific server operations.
-        Sets up the TensorFlow Lite interpreter, resizes input tensor, and allocates tensors.
+        Sets up the NUM_INTERPRETERS TensorFlow Lite interpreters, resizes input tensor, and allocates tensors.
         """
         start = time.perf_counter()
 
-        # Load the TensorFlow Lite model with specified number of threads
-        self.interpreter = tf.lite.Interpreter(model_path=self.server_configs['MODEL_PATH'], num_threads=self.server_configs['NUM_THREADS'])
+        self.interpreters = []
+        self.idle_interpreters = queue.Queue()
+        for _ in range(self.server_configs['NUM_INTERPRETERS']):
+            # Load the TensorFlow Lite model with specified number of threads
+            interpreter = Interpreter(model_path=self.server_configs['MODEL_PATH'], num_threads=self.server_configs['NUM_THREADS'])
 
-        # Resize the input tensor to match the specified batch size
-        input_details = self.interpreter.get_input_details()
-        shape = input_details[0]['shape']
-        shape[0] = self.server_configs['BATCH_SIZE']
-        self.interpreter.resize_tensor_input(input_details[0]['index'], shape)
+            # Resize the input tensor to match the specified batch size
+            input_details = interpreter.get_input_details()
+            shape = input_details[0]['shape']
+            shape[0] = self.server_configs['BATCH_SIZE']
+            interpreter.resize_tensor_input(input_details[0]['index'], shape)
 
-        # Allocate memory for tensors in the interpreter
-        self.interpreter.allocate_tensors()
+            # Allocate memory for tensors in the interpreter
+            interpreter.allocate_tensors()
+            self.interpreters.append(interpreter)
+            self.idle_interpreters.put(interpreter)
+        self.interpreter = self.interpreters[0]
 
         # Store input and output details in server configurations
         self.server_configs['input_details'] = self.interpreter.get_input_details()
         self.server_configs['output_details'] = self.interpreter.get_output_details()
 
         # Log input and output details for debugging purposes
-        self.log(f"Input Details: {self.server_configs['input_details'][0]['shape']}, {self.server_configs['input_details'][0]['dtype']}")
-        self.log(f"Output Details: {self.server_configs['output_details'][0]['shape']}, {self.server_configs['output_details'][0]['dtype']}")
+        self.log("Input Details: %s, %s", self.server_configs['input_details'][0]['shape'], self.server_configs['input_details'][0]['dtype'])
+        self.log("Output Details: %s, %s", self.server_configs['output_details'][0]['shape'], self.server_configs['output_details'][0]['dtype'])
 
         end = time.perf_counter()
         self.once_timings['init'] = end - start
-        self.log(f"Initialize time: {self.once_timings['init'] * 1000:.2f} ms")
+        self.log("Initialize time: %.2f ms", self.once_timings['init'] * 1000)
     
     def warm_up(self):
         """
         Run first-time AI-framework/platform pair-specific server operations.
-        Warm up the TensorFlow Lite interpreter by running a dummy input.
+        Warm up the TensorFlow Lite interpreters by running a dummy input.
         """
         start = time.perf_counter()
 
         # Create a dummy input tensor filled with zeros
         x_dummy = np.zeros(shape=self.server_configs['input_details'][0]['shape'], dtype=np.uint8)
-        self.interpreter.set_tensor(self.server_configs['input_details'][0]['index'], x_dummy)
-
-        # Run the dummy input through the TensorFlow Lite interpreter
-        self.interpreter.invoke()
-        _ = self.interpreter.get_tensor(self.server_configs['output_details'][0]['index'])
+        for interpreter in self.interpreters:
+            # Run the dummy input through the TensorFlow Lite interpreter
+            self.run_interpreter(interpreter, x_dummy, copy_output=False)
 
         end = time.perf_counter()
         self.once_timings['warm_up'] = end - start
-        self.log(f"Warmup time: {self.once_timings['warm_up'] * 1000:.2f} ms")
+        self.log("Warmup time: %.2f ms", self.once_timings['warm_up'] * 1000)
     
+    def resize_threads(self, num_threads):
+        """
+        Set NUM_THREADS and initialize (new interpreters) and warm up the server again for it.
+        Used by BaseServer.autotune_num_threads.
+        """
+        self.server_configs['NUM_THREADS'] = num_threads
+        self.init_kernel()
+        self.warm_up()
+
+    def run_interpreter(self, interpreter, x_input, copy_output):
+        """
+        Run the interpreter on one input through views of its tensors (interpreter.tensor), instead of set_tensor and get_tensor.
+        The input is written into the input tensor in place, and the view is dropped before invoke, which fails while
+        any view of the internal buffers of the interpreter is alive. The output is a view of the output tensor, only
+        valid until the next invoke, so every reference to it must be dropped by then; with copy_output it is copied out.
+        """
+        input_view = interpreter.tensor(self.server_configs['input_details'][0]['index'])()
+        input_view[...] = x_input
+        del input_view
+        interpreter.invoke()
+        exp_output = interpreter.tensor(self.server_configs['output_details'][0]['index'])()
+        return exp_output.copy() if copy_output else exp_output
+
     def experiment_single(self, input, run_total=1):
         """
         Execute the experiment for single input data.
         Works only in Latency Server Mode (self.server_configs['SERVER_MODE'] == 0).
         Takes a numpy array as input and returns a numpy array as output.
+        With ZERO_COPY_OUTPUT, the output is a view of the output tensor, released by inference_postprocess (or
+        inference_batch) before the next request runs the interpreter again.
         """
-        # Set the provided input tensor and run the interpreter
-        self.interpreter.set_tensor(self.server_configs['input_details'][0]['index'], input)
-        self.interpreter.invoke()
-        exp_output = self.interpreter.get_tensor(self.server_configs['output_details'][0]['index'])
-        return exp_output
+        return self.run_interpreter(self.interpreter, input, copy_output=not self.server_configs['ZERO_COPY_OUTPUT'])
 
     def experiment_multiple(self, dataset, run_total):
         """
         Execute the experiment for multiple input data.
         Works only in Throughput Server Mode (self.server_configs['SERVER_MODE'] == 1).
-        Takes a tf.data.Dataset as input and returns a numpy array as output.
+        Takes an iterator of numpy batches as input and returns a numpy array as output.
+        The batches are executed by BaseServer.execute_batches, concurrently on the pool of NUM_INTERPRETERS interpreters.
         """
-        output_list = []
-        iterations = run_total // self.server_configs['BATCH_SIZE']
-        remainder_iteration = 1 if iterations * self.server_configs['BATCH_SIZE'] != run_total else 0
-
-        # Iterate through the dataset, batching data and feeding it to the model
-        for i, element in enumerate(dataset.take(iterations + remainder_iteration)):
-            x_test = element
-            if i == iterations:  # Process any remainder data in the last iteration
-                x_input = tf.zeros(shape=self.server_configs['input_details'][0]['shape'])
-                x_input_list = tf.unstack(x_input)
-                x_input_list[0:x_test.shape[0]] = x_test[:]
-                x_input = tf.stack(x_input_list)
-            else:
-                x_input = x_test
-
-            # Run the model and append results to output list
-            self.interpreter.set_tensor(self.server_configs['input_details'][0]['index'], x_input)
-            self.interpreter.invoke()
-            output_data = self.interpreter.get_tensor(self.server_configs['output_details'][0]['index'])
-            valid_outputs = x_test.shape[0] if i == iterations else self.server_configs['BATCH_SIZE']
-            output_list.append(output_data[0:valid_outputs, :])
-
-        # Concatenate all individual outputs to form a single numpy array
-        concat_start = time.perf_counter()
-        exp_output = np.concatenate(output_list, axis=0)
-        concat_end = time.perf_counter()
-
-        self.log(f"Concat output time: {(concat_end - concat_start) * 1000:.2f} ms")
-        return exp_output
+        # execute_batches copies every output into its preallocated output before running the next batch, except with
+        # concurrent batches, whose outputs outlive the return of the interpreter to the pool
+        copy_output = self.server_configs['PARALLEL_BATCHES'] > 1
+
+        def run_batch(x_input):
+            # Run the model on one batch, on a free interpreter of the pool
+            interpreter = self.idle_interpreters.get()
+            try:
+                return self.run_interpreter(interpreter, x_input, copy_output=copy_output)
+            finally:
+                self.idle_interpreters.put(interpreter)
+
+        return self.execute_batches(dataset=dataset, run_total=run_total, run_batch=run_batch)
 
     def platform_preprocess(self, data):
         """Preprocess the input, specific to the platform requirement, not the experiment ones. Used in create_and_preprocess as the last step."""
         # Convert data if dtype is uint8
         if self.server_configs['input_details'][0]['dtype'] == np.uint8:
             input_scale, input_zero_point = self.server_configs['input_details'][0]["quantization"]
-            data = data / input_scale + input_zero_point
-            data = tf.cast(x=data, dtype=tf.uint8)
+            data = np.asarray(data) / input_scale + input_zero_point
+            data = data.astype(np.uint8)
         return data
 
     def platform_postprocess(self, data):
@@ -10,12 +10,14 @@ Overview:
 - It includes methods for single and multiple inference runs, warm-up routines, and platform-specific preprocessing and postprocessing.
 
 Classes:
+- DeadlineCallback: Keras callback that stops experiment_multiple between batches once the request deadline has passed.
 - ArmTfServer: Inherits from BaseExperimentServer and implements ARM_TF-specific initialization and inference methods.
 
 Methods:
-- __init__(self, logger): Initializes the ArmTfServer instance, sets up the logger, initializes the kernel, and performs a warm-up run.
+- __init__(self, logger, model_path=None): Initializes the ArmTfServer instance, sets up the logger, initializes the kernel, and performs a warm-up run.
 - init_kernel(self): Sets up the number of threads, loads the TensorFlow model, and configures execution settings.
 - warm_up(self): Performs a warm-up run by passing a dummy input through the TensorFlow model.
+- resize_batch(self, batch_size): Sets BATCH_SIZE and warms up again, without loading the model again.
 - experiment_single(self, input, run_total=1): Executes a single experiment, taking a numpy array as input and returning a numpy array as output.
 - experiment_multiple(self, dataset, run_total): Executes multiple experiments, taking a tf.data.Dataset as input and returning a numpy array as output.
 - platform_preprocess(self, data): Placeholder for AI-framework/platform pair-specific preprocessing.
@@ -31,14 +33,23 @@ import tensorflow as tf
 
 import experiment_server
 
+class DeadlineCallback(tf.keras.callbacks.Callback):
+    """Keras callback that stops model.predict between batches once the deadline of the current request has passed."""
+    def __init__(self, server):
+        super().__init__()
+        self.server = server
+
+    def on_predict_batch_begin(self, batch, logs=None):
+        self.server.check_deadline()
+
 class ArmTfServer(experiment_server.BaseExperimentServer):
     """
     ARM_TF-specific server implementation for running TensorFlow models.
     Inherits from BaseExperimentServer and implements ARM_TF-specific initialization and inference methods.
     """
-    def __init__(self, logger):
+    def __init__(self, logger, model_path=None):
         """Initialize the ArmTfServer instance, set up the logger, initialize the kernel, and perform a warm-up run."""
-        super().__init__(logger)
+        super().__init__(logger, model_path=model_path)
         self.model = None
         self.server_configs['NUM_THREADS'] = int(os.environ['NUM_THREADS'])
         self.init_kernel()
@@ -52,8 +63,12 @@ class ArmTfServer(experiment_server.BaseExperimentServer):
         start = time.perf_counter()
 
         # Set number of threads for intra and inter operations in TensorFlow
-        tf.config.threading.set_intra_op_parallelism_threads(self.server_configs['NUM_THREADS'])
-        tf.config.threading.set_inter_op_parallelism_threads(self.server_configs['NUM_THREADS'])
+        # They can only be set before the TensorFlow runtime is initialized, i.e., by the first server instance of the process
+        try:
+            tf.config.threading.set_intra_op_parallelism_threads(self.server_configs['NUM_THREADS'])
+            tf.config.threading.set_inter_op_parallelism_threads(self.server_configs['NUM_THREADS'])
+        except RuntimeError as e:
+            self.log("TensorFlow threading already initialized: %s", e)
 
         # Load the Keras model from the specified path
         self.model = tf.keras.models.load_model(filepath=self.server_configs['MODEL_PATH'])
@@ -65,14 +80,14 @@ class ArmTfServer(experiment_server.BaseExperimentServer):
         self.server_configs['inter_op_parallelism_threads'] = tf.config.threading.get_inter_op_parallelism_threads()
 
         # Logging for debugging
-        self.log(f"Input Shape: {self.server_configs['input_shape']}")
-        self.log(f"Output Shape: {self.server_configs['output_shape']}")
-        self.log(f"Intra Op Parallelism Threads: {self.server_configs['intra_op_parallelism_threads']}")
-        self.log(f"Inter Op Parallelism Threads: {self.server_configs['inter_op_parallelism_threads']}")
+        self.log("Input Shape: %s", self.server_configs['input_shape'])
+        self.log("Output Shape: %s", self.server_configs['output_shape'])
+        self.log("Intra Op Parallelism Threads: %s", self.server_configs['intra_op_parallelism_threads'])
+        self.log("Inter Op Parallelism Threads: %s", self.server_configs['inter_op_parallelism_threads'])
 
         end = time.perf_counter()
         self.once_timings['init'] = end - start
-        self.log(f"Initialize time: {self.once_timings['init'] * 1000:.2f} ms")
+        self.log("Initialize time: %.2f ms", self.once_timings['init'] * 1000)
     
     def warm_up(self):
         """
@@ -87,7 +102,16 @@ class ArmTfServer(experiment_server.BaseExperimentServer):
 
         end = time.perf_counter()
         self.once_timings['warm_up'] = end - start
-        self.log(f"Warmup time: {self.once_timings['warm_up'] * 1000:.2f} ms")
+        self.log("Warmup time: %.2f ms", self.once_timings['warm_up'] * 1000)
+
+    def resize_batch(self, batch_size):
+        """
+        Set BATCH_SIZE and warm up again for it, used by BaseServer.autotune_batch_size.
+        The Keras model takes any batch size, so it is not loaded again.
+        """
+        self.server_configs['BATCH_SIZE'] = batch_size
+        self.inference_metrics['batch_size'] = batch_size
+        self.warm_up()
 
     def experiment_single(self, input, run_total=1):
         """
@@ -104,14 +128,15 @@ class ArmTfServer(experiment_server.BaseExperimentServer):
         Works only in Throughput Server Mode (self.server_configs['SERVER_MODE'] == 1).
         Takes a tf.data.Dataset as input and returns a numpy array as output.
         """
-        output_list = self.model.predict(x=dataset, verbose=0)
+        # Stop between batches if the deadline of the request has passed
+        output_list = self.model.predict(x=dataset, verbose=0, callbacks=[DeadlineCallback(self)])
 
         # Concatenate all individual outputs to form a single numpy array
         concat_start = time.perf_counter()
         exp_output = np.concatenate(output_list, axis=0)
         concat_end = time.perf_counter()
 
-        self.log(f"Concat output time: {(concat_end - concat_start) * 1000:.2f} ms")
+        self.log("Concat output time: %.2f ms", (concat_end - concat_start) * 1000)
         return exp_output
 
     def platform_preprocess(self, data):
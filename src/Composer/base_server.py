@@ -11,25 +11,53 @@ Overview:
   needed for each platform.
 - This class encapsulates common server functionalities, including:
   - Initialization of server configurations, metrics, timings, and AI characteristics.
-  - Logging and Redis connection management.
+  - Logging and metrics exporters management.
   - Inference workflow management from decoding input to encoding output.
   - Benchmark metrics calculation and logging.
-  - Redis data creation and sending.
+  - Metrics exporting (Redis, file, Prometheus).
   - Saving and logging metrics for analysis.
 
 Functionality:
 - Initialization:
   - Loads server configurations, metrics, and AI characteristics.
-  - Sets up logging and Redis connections if required.
+  - Sets up logging and the metrics exporters (e.g., the Redis connection) if required.
+  - Times the environment loading and the creation of the metrics exporters in once_timings, next to init and warm_up.
 - Inference Workflow:
   - Manages the end-to-end inference process, including input decoding, data preprocessing, 
     experiment execution, postprocessing, and output encoding.
   - Each step in the workflow is designed to be overridden by subclass implementations to provide 
     AI-framework/platform pair-specific or experiment-specific functionality.
+  - The workflow is split into three stages, inference_preprocess, inference_execute and inference_postprocess,
+    which flask_server.py can run in a pipeline. Per-request state of the steps is kept in request_state.
+  - A request may carry a deadline. An expired request raises DeadlineExceeded before decoding, before the
+    experiment, and between the batches of experiment_multiple (through check_deadline), so no more
+    accelerator time is spent on a result the client no longer waits for.
+  - An optional content-addressed result cache (result_cache), shared by all the server replicas, lets
+    flask_server.py answer repeated payloads and experiment_server.py skip the execution of repeated items.
+    A request whose items are all cached reaches the experiment with run_total == 0 and skips it.
+  - In Throughput Server Mode, execute_batches runs the batches of experiment_multiple through the run_batch
+    callback of each {Pair}Server, padding the remainder in a reused buffer and writing into a preallocated output.
+    With PARALLEL_BATCHES > 1 (e.g., a pool of TFLite interpreters), the batches run concurrently on a thread pool,
+    and their outputs are still written in order.
+  - In Latency Server Mode, single-item requests merged by the dynamic batcher of flask_server.py are 
+    executed together through inference_batch, and their outputs are split back to each request.
+- Steady-State Warm-Up:
+  - With WARM_UP_MAX_ITERATIONS, converge_warm_up repeats the serving code path (with a bundled sample request, or
+    synthetic inputs) until the latency converges, so the first real requests do not skew the metrics.
+- Batch Size and Thread Autotuning:
+  - With BATCH_AUTOTUNE, autotune_batch_size sweeps candidate batch sizes with synthetic inputs at startup and selects
+    the one with the highest throughput under a latency SLO. The curve is reported in once_timings['batch_autotune'].
+  - With THREAD_AUTOTUNE, autotune_num_threads sweeps the thread counts that fit in the CPU quota of a replica, for
+    the {Pair}Servers that implement resize_threads. The curve is reported in once_timings['thread_autotune'].
 - Metrics and Logging:
+  - Logs with lazy %-formatting, and only one in every LOG_SAMPLE_RATE requests in full.
   - Calculates various benchmarks related to inference latency and throughput.
   - Saves and logs metrics for performance analysis.
-  - Optionally sends metrics to a Redis server for real-time monitoring.
+  - Records the stage timings of every inference call in constant-memory latency histograms (stage_histograms),
+    per server mode, for the percentiles of the stats service.
+  - Optionally exports the metrics (METRICS_EXPORTERS): to a Redis server for real-time monitoring (from a background
+    exporter with ASYNC_REDIS_EXPORT, pre-aggregated in wall-clock windows with REDIS_AGGREGATE_WINDOW_S), to a local
+    JSON Lines or CSV file, or to the Prometheus endpoint.
 
 Note:
 - This module also imports and uses a custom module named 'utils' for various utility functions.
@@ -42,33 +70,101 @@ DO NOT edit this file directly.
 
 import os
 import time
+import threading
+import itertools
+import math
+import collections
+import concurrent.futures
 from dotenv import load_dotenv
 import numpy as np
 import utils  # Custom module for utility functions
 
+class DeadlineExceeded(Exception):
+    """
+    Raised by BaseServer.check_deadline when the deadline of the current request has passed.
+    flask_server.py answers the request with 504 and counts the expiration.
+    """
+
 class BaseServer:
     """
     This is the foundational class for server operations across different platforms and experiments.
     It provides methods for managing the server's workflow, from data input to response generation, 
-    and also for metrics, logging, and Redis connections.
+    and also for metrics, logging, and metrics exporters.
     """
-    def __init__(self, my_logger):
-        """Initialize server configurations, metrics, timings, and AI characteristics."""
+    def __init__(self, my_logger, model_path=None):
+        """
+        Initialize server configurations, metrics, timings, and AI characteristics.
+        model_path: the model to load, instead of MODEL_NAME (e.g., a model of the registry of flask_server.py).
+        """
         self.logger = my_logger
-        self.my_redis = None
-        self.my_metrics_list = utils.LimitedList(int(os.environ['METRICS_LIST_SIZE']))
+        self.metrics_exporters = []  # The shared metrics exporters of METRICS_EXPORTERS, see create_metrics_exporters
+        self.request_local = threading.local()  # Holds the request_state of the request processed by each thread
+        # Shared by all the server replicas of the process, see flask_server.py
+        self.my_metrics_list = utils.shared_metrics_list(int(os.environ['METRICS_LIST_SIZE']), store_path=os.getenv('METRICS_STORE_PATH', ''),
+                                                         store_size=int(os.getenv('METRICS_STORE_SIZE', '100000')))
+        self.stage_histograms = utils.shared_stage_histograms()
 
         # Configuration settings for the server
         self.server_configs = {
-            'MODEL_PATH': os.environ['MODEL_NAME'],
+            'MODEL_PATH': model_path if model_path is not None else os.environ['MODEL_NAME'],
             'BATCH_SIZE': int(os.environ['BATCH_SIZE']),
             'SEND_METRICS': utils.strtobool(os.environ['SEND_METRICS']),
+            'METRICS_EXPORTERS': [name.strip().lower() for name in os.getenv('METRICS_EXPORTERS', '').split(',') if name.strip()],
+            'ASYNC_REDIS_EXPORT': utils.strtobool(os.getenv('ASYNC_REDIS_EXPORT', 'False')),
+            'REDIS_AGGREGATE_WINDOW': float(os.getenv('REDIS_AGGREGATE_WINDOW_S', '0')),  # 0 sends every inference
             'AIF_timestamp': int(time.perf_counter()*1000),
-            'SERVER_MODE': utils.decode_server_mode(os.environ['SERVER_MODE'])  # 0 == LAT, 1 == THR
+            'SERVER_MODE': utils.decode_server_mode(os.environ['SERVER_MODE']),  # 0 == LAT, 1 == THR
+            'DYNAMIC_BATCHING': utils.strtobool(os.getenv('DYNAMIC_BATCHING', 'False')),
+            'MAX_BATCH_DELAY': float(os.getenv('MAX_BATCH_DELAY_MS', '5')) / 1000,
+            'RESULT_CACHE': utils.strtobool(os.getenv('RESULT_CACHE', 'False')),
+            'LOG_SAMPLE_RATE': int(os.getenv('LOG_SAMPLE_RATE', '1')),
+            'NUMPY_DATASET': False,  # Set by the {Pair}Servers that take NumPy batches instead of a tf.data.Dataset
+            'PARALLEL_BATCHES': 1,  # Set by the {Pair}Servers whose run_batch can execute batches concurrently, see execute_batches
+            'BATCH_AUTOTUNE': utils.strtobool(os.getenv('BATCH_AUTOTUNE', 'False')),
+            'BATCH_AUTOTUNE_CANDIDATES': [int(batch_size) for batch_size in os.getenv('BATCH_AUTOTUNE_CANDIDATES', '1,2,4,8,16,32,64').split(',')],
+            'BATCH_AUTOTUNE_SLO': float(os.getenv('BATCH_AUTOTUNE_SLO_MS', '0')),
+            'BATCH_AUTOTUNE_RUNS': int(os.getenv('BATCH_AUTOTUNE_RUNS', '10')),
+            'THREAD_AUTOTUNE': utils.strtobool(os.getenv('THREAD_AUTOTUNE', 'False')),
+            'THREAD_AUTOTUNE_CANDIDATES': [int(num_threads) for num_threads in os.getenv('THREAD_AUTOTUNE_CANDIDATES', '').split(',') if num_threads],
+            'THREAD_AUTOTUNE_RUNS': int(os.getenv('THREAD_AUTOTUNE_RUNS', '10')),
+            'WARM_UP_MAX_ITERATIONS': int(os.getenv('WARM_UP_MAX_ITERATIONS', '0')),  # 0 disables the steady-state warm-up
+            'WARM_UP_WINDOW': int(os.getenv('WARM_UP_WINDOW', '5')),
+            'WARM_UP_TOLERANCE': float(os.getenv('WARM_UP_TOLERANCE', '0.05')),
+            'WARM_UP_SAMPLE': os.getenv('WARM_UP_SAMPLE', '')
         }
+        if self.server_configs['SEND_METRICS'] and 'redis' not in self.server_configs['METRICS_EXPORTERS']:
+            self.server_configs['METRICS_EXPORTERS'].append('redis')
+        assert set(self.server_configs['METRICS_EXPORTERS']) <= {'redis', 'file', 'prometheus'}, \
+            f"METRICS_EXPORTERS should be a comma-separated list of redis, file and prometheus, got {self.server_configs['METRICS_EXPORTERS']}"
+        assert self.server_configs['WARM_UP_WINDOW'] > 0, f"WARM_UP_WINDOW should be a positive integer, got {self.server_configs['WARM_UP_WINDOW']}"
+        if self.server_configs['BATCH_AUTOTUNE']:
+            assert self.server_configs['SERVER_MODE'] == 1 or self.server_configs['DYNAMIC_BATCHING'], \
+                'Batch size autotuning works only in Throughput Server Mode, or in Latency Server Mode with dynamic batching'
+            assert all(batch_size > 0 for batch_size in self.server_configs['BATCH_AUTOTUNE_CANDIDATES']), \
+                f"BATCH_AUTOTUNE_CANDIDATES should be positive integers, got {self.server_configs['BATCH_AUTOTUNE_CANDIDATES']}"
+            assert self.server_configs['BATCH_AUTOTUNE_RUNS'] > 0, f"BATCH_AUTOTUNE_RUNS should be a positive integer, got {self.server_configs['BATCH_AUTOTUNE_RUNS']}"
+        if self.server_configs['THREAD_AUTOTUNE']:
+            assert self.server_configs['THREAD_AUTOTUNE_RUNS'] > 0, f"THREAD_AUTOTUNE_RUNS should be a positive integer, got {self.server_configs['THREAD_AUTOTUNE_RUNS']}"
+        assert self.server_configs['LOG_SAMPLE_RATE'] > 0, f"LOG_SAMPLE_RATE should be a positive integer, got {self.server_configs['LOG_SAMPLE_RATE']}"
+        self.request_counter = itertools.count()  # Numbers the requests for the log sampling
+        self.input_buffer = None  # Reused zero-padded input batch of BATCH_SIZE items, see batch_buffer
+        self.batch_pool = None  # Thread pool of execute_batches, with PARALLEL_BATCHES > 1
+        self.warming_up = False  # Set during the steady-state warm-up, whose requests are not recorded in the metrics
+
+        # Content-addressed result cache, shared by all the server replicas of the process (None if disabled)
+        self.result_cache = None
+        if self.server_configs['RESULT_CACHE']:
+            self.result_cache = utils.shared_result_cache(max_entries=int(os.getenv('RESULT_CACHE_MAX_ENTRIES', '1024')),
+                                                          max_bytes=int(float(os.getenv('RESULT_CACHE_MAX_MB', '64')) * 1024 * 1024),
+                                                          ttl=float(os.getenv('RESULT_CACHE_TTL_S', '0')))
+        # Completed hot swaps of the model when this server was loaded (set by flask_server.py), so the result cache
+        # keys of experiment_server.py (e.g., the images of CLASSIFICATION_THR) tell a swapped model from the old one
+        self.model_generation = 0
 
         # Timings related to server operations
         self.once_timings = {
+            'load_env': None,
+            'create_exporters': None,
             'init': None,
             'warm_up': None
         }
@@ -81,7 +177,7 @@ class BaseServer:
             'postprocess': None,
             'encode_output': None,
             'full_inference': None,
-            'redis_send': None,
+            'export_metrics': None,
             'save_metrics': None
         }
 
@@ -104,12 +200,27 @@ class BaseServer:
             'focus': os.environ['FOCUS']
         }
 
-        self.create_redis()  # Create a Redis connection if required
+        exporters_start = time.perf_counter()
+        self.metrics_exporters = utils.shared_metrics_exporters(self.create_metrics_exporters)
+        load_env_start = time.perf_counter()
+        self.once_timings['create_exporters'] = load_env_start - exporters_start
         self.load_env_variables()
+        self.once_timings['load_env'] = time.perf_counter() - load_env_start
 
-    def log(self, string_message):
-        """Log a message using the server's logger."""
-        self.logger.info(string_message)
+    def log(self, string_message, *args):
+        """
+        Log a message using the server's logger.
+        The message is %-formatted with args only if it is emitted (lazy formatting), off the hot path with ASYNC_LOGGING.
+        While a request is processed, only the sampled requests (one every LOG_SAMPLE_RATE) are logged.
+        """
+        request_state = getattr(self.request_local, 'state', None)
+        if request_state is not None and not request_state['log_sampled']:
+            return
+        self.logger.info(string_message, *args)
+
+    def sample_request_log(self):
+        """Return whether the next request is logged in full, one every LOG_SAMPLE_RATE requests."""
+        return next(self.request_counter) % self.server_configs['LOG_SAMPLE_RATE'] == 0
     
     def load_env_variables(self):
         """Load environment variables from a specified .env file on ENV_FILE env variable."""
@@ -119,15 +230,39 @@ class BaseServer:
         """Define experiment configurations. Must be overridden by experiment_server.py (BaseExperimentServer)."""
         raise AssertionError('Forgot to overload set_experiment_configs. Must be overridden by experiment_server.py (BaseExperimentServer).')
 
-    def create_redis(self):
-        """Attempt to create a Redis connection."""
-        if self.server_configs['SEND_METRICS']:
-            try:
-                utils.read_node_env_variables()
-                self.my_redis = utils.create_redis()
-                self.log('Created Redis connection')
-            except Exception as e:
-                self.log(f"Could not create Redis connection: {str(e)}")
+    def create_metrics_exporters(self):
+        """
+        Create the metrics exporters of METRICS_EXPORTERS, once per process (utils.shared_metrics_exporters):
+        - redis (or SEND_METRICS): RedisTimeSeries, through the background exporter with ASYNC_REDIS_EXPORT, and
+          pre-aggregated with REDIS_AGGREGATE_WINDOW_S. Skipped if the Redis connection cannot be created.
+        - file: A size-rotated JSON Lines or CSV file (METRICS_FILE_*).
+        - prometheus: The series of the /metrics endpoint of flask_server.py.
+        """
+        exporters = []
+        for name in self.server_configs['METRICS_EXPORTERS']:
+            if name == 'redis':
+                try:
+                    utils.read_node_env_variables()
+                    exporters.append(utils.RedisMetricsExporter(self.logger, async_export=self.server_configs['ASYNC_REDIS_EXPORT'],
+                                                                queue_size=int(os.getenv('REDIS_EXPORT_QUEUE_SIZE', '10000')),
+                                                                flush_size=int(os.getenv('REDIS_EXPORT_FLUSH_SIZE', '100')),
+                                                                flush_interval=float(os.getenv('REDIS_EXPORT_FLUSH_MS', '1000')) / 1000,
+                                                                backoff_max=float(os.getenv('REDIS_EXPORT_BACKOFF_MAX_S', '30')),
+                                                                aggregate_window=self.server_configs['REDIS_AGGREGATE_WINDOW']))
+                    self.log('Created Redis connection')
+                except Exception as e:
+                    self.log("Could not create Redis connection: %s", e)
+            elif name == 'file':
+                exporters.append(utils.FileMetricsExporter(path=os.getenv('METRICS_FILE_PATH', 'aif_metrics.jsonl'),
+                                                           file_format=os.getenv('METRICS_FILE_FORMAT', 'jsonl').lower(),
+                                                           max_bytes=int(float(os.getenv('METRICS_FILE_MAX_MB', '64')) * 1024 * 1024),
+                                                           backup_count=int(os.getenv('METRICS_FILE_BACKUPS', '5')),
+                                                           buffer_bytes=int(float(os.getenv('METRICS_FILE_BUFFER_KB', '64')) * 1024),
+                                                           flush_interval=float(os.getenv('METRICS_FILE_FLUSH_MS', '1000')) / 1000))
+                self.log("Exporting metrics to %s", exporters[-1].path)
+            elif name == 'prometheus':
+                exporters.append(utils.PrometheusMetricsExporter())
+        return exporters
 
     def init_kernel(self):
         """
@@ -143,11 +278,218 @@ class BaseServer:
         """
         raise AssertionError('Forgot to overload warm_up. Must be overridden by {pair}_server.py ({Pair}Server).')
 
+    def resize_batch(self, batch_size):
+        """
+        Set BATCH_SIZE and initialize and warm up the server again for it. Used by autotune_batch_size.
+        May be overridden by {pair}_server.py ({Pair}Server), e.g., when init_kernel does not depend on BATCH_SIZE.
+        """
+        self.server_configs['BATCH_SIZE'] = batch_size
+        self.inference_metrics['batch_size'] = batch_size
+        self.init_kernel()
+        self.warm_up()
+
+    def resize_threads(self, num_threads):
+        """
+        Set NUM_THREADS and initialize and warm up the server again for it. Used by autotune_num_threads.
+        Must be overridden by the {pair}_server.py ({Pair}Server) that support THREAD_AUTOTUNE.
+        """
+        raise AssertionError('Thread autotuning is not supported by this {Pair}Server.')
+
+    def measure_synthetic_batches(self, batch_size, runs):
+        """
+        Execute runs synthetic (zero) batches of batch_size items of expected_input, through experiment_multiple
+        (experiment_single in Latency Server Mode). Used by the autotuning sweeps.
+        With PARALLEL_BATCHES > 1, every run executes PARALLEL_BATCHES batches concurrently through experiment_multiple.
+        Returns the mean and 95th percentile latency (ms) of a run and the throughput (fps).
+        """
+        assert 'expected_input' in self.experiment_configs, 'Autotuning needs expected_input in the experiment configurations'
+        x_input = self.platform_preprocess(np.zeros(shape=(batch_size,) + tuple(self.experiment_configs['expected_input'][1:]), dtype=np.float32))
+        batches = self.server_configs['PARALLEL_BATCHES'] if self.server_configs['SERVER_MODE'] == 1 else 1
+        latencies = []
+        # The synthetic runs are not logged, and the state of the calling thread is restored for its startup logs
+        previous_state = getattr(self.request_local, 'state', None)
+        self.bind_request_state({'timings': {}, 'deadline': None, 'log_sampled': False})
+        try:
+            for _ in range(runs):
+                run_start = time.perf_counter()
+                if self.server_configs['SERVER_MODE'] == 0:
+                    self.experiment_single(input=x_input, run_total=batch_size)
+                else:
+                    self.experiment_multiple(dataset=(x_input for _ in range(batches)), run_total=batch_size * batches)
+                latencies.append(time.perf_counter() - run_start)
+        finally:
+            self.bind_request_state(previous_state)
+        latencies.sort()
+        mean_latency = sum(latencies) / runs
+        return {
+            'latency_mean_ms': mean_latency * 1000,
+            'latency_p95_ms': latencies[math.ceil(0.95 * runs) - 1] * 1000,
+            'throughput': batch_size * batches / mean_latency
+        }
+
+    def autotune_batch_size(self):
+        """
+        Select BATCH_SIZE automatically, if BATCH_AUTOTUNE is enabled. Called by flask_server.py after the server is created.
+        The candidate batch sizes are swept once per model (sweep_batch_sizes) and the result is reused by the other replicas.
+        The selected batch size, and the measured curve, are stored in once_timings['batch_autotune'].
+        """
+        if not self.server_configs['BATCH_AUTOTUNE']:
+            return
+        result = utils.shared_autotune(key=('batch_size', self.server_configs['MODEL_PATH']), sweep=self.sweep_batch_sizes)
+        if self.server_configs['BATCH_SIZE'] != result['batch_size']:
+            self.resize_batch(result['batch_size'])
+        self.once_timings['batch_autotune'] = result
+        self.log("Autotuned batch size: %s", result['batch_size'])
+
+    def sweep_batch_sizes(self):
+        """
+        Measure every candidate batch size of BATCH_AUTOTUNE_CANDIDATES, BATCH_AUTOTUNE_RUNS times (measure_synthetic_batches).
+        Selects the batch size with the highest throughput whose 95th percentile batch latency meets BATCH_AUTOTUNE_SLO_MS
+        (any latency if 0), or the fastest one if none meets it. The sweep stops at the first batch size over the SLO.
+        Returns a dictionary with the selected batch size, the SLO, the sweep time and the curve of the measured batch sizes.
+        """
+        sweep_start = time.perf_counter()
+        slo = self.server_configs['BATCH_AUTOTUNE_SLO']
+        curve = []
+        for batch_size in self.server_configs['BATCH_AUTOTUNE_CANDIDATES']:
+            try:
+                self.resize_batch(batch_size)
+                point = dict(batch_size=batch_size, **self.measure_synthetic_batches(batch_size=batch_size, runs=self.server_configs['BATCH_AUTOTUNE_RUNS']))
+            except Exception as e:
+                # E.g., a model exported for a fixed batch size
+                self.logger.warning("Batch size %s could not be executed: %s", batch_size, e)
+                curve.append({'batch_size': batch_size, 'error': str(e)})
+                continue
+            curve.append(point)
+            self.logger.info("Batch size %s: %.2f ms p95 batch latency, %.2f fps", batch_size, point['latency_p95_ms'], point['throughput'])
+            if slo > 0 and point['latency_p95_ms'] > slo:
+                break
+
+        measured = [point for point in curve if 'error' not in point]
+        assert measured, f"None of the BATCH_AUTOTUNE_CANDIDATES could be executed, got {curve}"
+        within_slo = [point for point in measured if slo == 0 or point['latency_p95_ms'] <= slo]
+        if within_slo:
+            selected = max(within_slo, key=lambda point: point['throughput'])
+        else:
+            selected = min(measured, key=lambda point: point['latency_p95_ms'])
+            self.logger.warning("No batch size meets the latency SLO of %.2f ms, selected the fastest one", slo)
+        return {
+            'batch_size': selected['batch_size'],
+            'slo_ms': slo,
+            'met_slo': bool(within_slo),
+            'sweep_time': time.perf_counter() - sweep_start,
+            'curve': curve
+        }
+
+    def autotune_num_threads(self):
+        """
+        Select NUM_THREADS automatically, if THREAD_AUTOTUNE is enabled. Called by flask_server.py after the server is created,
+        before autotune_batch_size. The thread counts are swept once per model (sweep_num_threads) and the result is reused
+        by the other replicas. The selected thread count, and the measured curve, are stored in once_timings['thread_autotune'].
+        """
+        if not self.server_configs['THREAD_AUTOTUNE']:
+            return
+        assert 'NUM_THREADS' in self.server_configs, 'Thread autotuning is supported only by the {Pair}Servers with NUM_THREADS'
+        result = utils.shared_autotune(key=('num_threads', self.server_configs['MODEL_PATH']), sweep=self.sweep_num_threads)
+        if self.server_configs['NUM_THREADS'] != result['num_threads']:
+            self.resize_threads(result['num_threads'])
+        self.once_timings['thread_autotune'] = result
+        self.log("Autotuned number of threads: %s", result['num_threads'])
+
+    def sweep_num_threads(self):
+        """
+        Measure every candidate thread count, THREAD_AUTOTUNE_RUNS batches of BATCH_SIZE each, with warm interpreters.
+        The candidates are THREAD_AUTOTUNE_CANDIDATES (default: the powers of two and the CPUs available to one replica),
+        capped by the CPUs available to one replica: the CPU affinity and cgroup CPU quota (utils.available_cpus)
+        divided by NUM_REPLICAS, and by PARALLEL_BATCHES (e.g., the interpreters of the pool, each with NUM_THREADS).
+        Selects the thread count with the highest throughput.
+        Returns a dictionary with the selected thread count, the available CPUs, the sweep time and the measured curve.
+        """
+        sweep_start = time.perf_counter()
+        replica_cpus = max(1, utils.available_cpus() // int(os.getenv('NUM_REPLICAS', '1')) // self.server_configs['PARALLEL_BATCHES'])
+        if self.server_configs['THREAD_AUTOTUNE_CANDIDATES']:
+            candidates = sorted({num_threads for num_threads in self.server_configs['THREAD_AUTOTUNE_CANDIDATES'] if num_threads <= replica_cpus})
+        else:
+            candidates = sorted({2 ** exponent for exponent in range(replica_cpus.bit_length())} | {replica_cpus})
+        assert candidates, f"None of the THREAD_AUTOTUNE_CANDIDATES fits in the {replica_cpus} CPUs available to a replica"
+        curve = []
+        for num_threads in candidates:
+            self.resize_threads(num_threads)
+            point = dict(num_threads=num_threads, **self.measure_synthetic_batches(batch_size=self.server_configs['BATCH_SIZE'], runs=self.server_configs['THREAD_AUTOTUNE_RUNS']))
+            curve.append(point)
+            self.logger.info("%s threads: %.2f ms mean batch latency, %.2f fps", num_threads, point['latency_mean_ms'], point['throughput'])
+        selected = max(curve, key=lambda point: point['throughput'])
+        return {
+            'num_threads': selected['num_threads'],
+            'available_cpus': replica_cpus,
+            'sweep_time': time.perf_counter() - sweep_start,
+            'curve': curve
+        }
+
+    def converge_warm_up(self):
+        """
+        Steady-state warm-up, after warm_up, if WARM_UP_MAX_ITERATIONS > 0. Called by flask_server.py after the server is
+        created and autotuned. Each iteration runs the code path of the server mode: the WARM_UP_SAMPLE request payload
+        through inference (inference_batch with BATCH_SIZE copies with dynamic batching), or without a sample a synthetic
+        batch through experiment_single or experiment_multiple (measure_synthetic_batches).
+        Stops when the latencies of the last WARM_UP_WINDOW iterations are all within WARM_UP_TOLERANCE (relative) of their
+        median, or after WARM_UP_MAX_ITERATIONS. The warm-up requests are not recorded in the metrics or the result cache.
+        The latency curve is stored in once_timings['steady_warm_up'].
+        """
+        max_iterations = self.server_configs['WARM_UP_MAX_ITERATIONS']
+        if max_iterations <= 0:
+            return
+        window = self.server_configs['WARM_UP_WINDOW']
+        tolerance = self.server_configs['WARM_UP_TOLERANCE']
+        sample = None
+        if self.server_configs['WARM_UP_SAMPLE']:
+            with open(self.server_configs['WARM_UP_SAMPLE'], 'rb') as f:
+                sample = f.read()
+        batched = self.server_configs['SERVER_MODE'] == 0 and self.server_configs['DYNAMIC_BATCHING']
+
+        start = time.perf_counter()
+        result_cache, self.result_cache = self.result_cache, None
+        previous_state = getattr(self.request_local, 'state', None)  # Rebound by every warm-up request
+        self.warming_up = True
+        latencies = []
+        converged = False
+        try:
+            while len(latencies) < max_iterations and not converged:
+                if sample is None:
+                    latencies.append(self.measure_synthetic_batches(batch_size=self.server_configs['BATCH_SIZE'], runs=1)['latency_mean_ms'])
+                else:
+                    iteration_start = time.perf_counter()
+                    if batched:
+                        self.inference_batch(indata_list=[sample] * self.server_configs['BATCH_SIZE'])
+                    else:
+                        self.inference(indata=sample)
+                    latencies.append((time.perf_counter() - iteration_start) * 1000)
+                if len(latencies) >= window:
+                    recent = sorted(latencies[-window:])
+                    median = recent[window // 2]
+                    converged = all(abs(latency - median) <= tolerance * median for latency in recent)
+        finally:
+            self.warming_up = False
+            self.result_cache = result_cache
+            self.bind_request_state(previous_state)
+
+        self.once_timings['steady_warm_up'] = {
+            'source': 'sample' if sample is not None else 'synthetic',
+            'iterations': len(latencies),
+            'converged': converged,
+            'time': time.perf_counter() - start,
+            'curve_ms': latencies
+        }
+        if converged:
+            self.log("Steady-state warm-up converged after %s iterations, at %.2f ms", len(latencies), latencies[-1])
+        else:
+            self.logger.warning("Steady-state warm-up did not converge within %s iterations, last at %.2f ms", len(latencies), latencies[-1])
+
     def send_response(self, encoded_output):
         """Send a response after processing. Must be overridden by experiment_server.py (BaseExperimentServer)."""
         raise AssertionError('Forgot to overload send_response. Must be overridden by experiment_server.py (BaseExperimentServer).')
 
-    def inference(self, indata):
+    def inference(self, indata, deadline=None):
         """
         Handle the entire inference process, including:
         - Decoding input
@@ -155,82 +497,284 @@ class BaseServer:
         - Experiment execution
         - Data postprocessing
         - Encoding output
+        The process is split into three stages (inference_preprocess, inference_execute and inference_postprocess),
+        which flask_server.py can also run in a pipeline, overlapping consecutive requests.
+        deadline: optional time.perf_counter() value after which the request is abandoned with DeadlineExceeded.
+        """
+        request_state = self.inference_preprocess(indata=indata, deadline=deadline)
+        self.inference_execute(request_state=request_state)
+        return self.inference_postprocess(request_state=request_state)
+
+    @property
+    def request_state(self):
+        """
+        Per-request dictionary, for experiment_server.py to keep state between the steps of one request
+        (e.g., the list of input files from decode_input used in encode_output).
+        It is bound to the thread running the current stage, so it stays correct when the stages of
+        consecutive requests run concurrently in pipelined mode.
+        """
+        return self.request_local.state
+
+    def bind_request_state(self, request_state):
+        """Bind request_state to the calling thread, for the steps run by the current stage."""
+        self.request_local.state = request_state
+
+    def check_deadline(self):
         """
+        Raise DeadlineExceeded if the deadline of the current request has passed.
+        Called before the decoding and the experiment, and should be called by experiment_multiple between batches.
+        """
+        deadline = self.request_state.get('deadline')
+        if deadline is not None and time.perf_counter() > deadline:
+            raise DeadlineExceeded(f"Request deadline exceeded by {(time.perf_counter() - deadline) * 1000:.2f} ms")
+
+    def cleanup_request(self):
+        """
+        Release the per-request resources of a request abandoned before encode_output (e.g., after DeadlineExceeded).
+        May be overridden by experiment_server.py (e.g., to remove a temporary dataset directory kept in request_state).
+        """
+        pass
+
+    def inference_preprocess(self, indata, deadline=None):
+        """
+        First inference stage, host-side: decoding input, data preprocessing and input reshaping.
+        Returns the request_state, which carries the dataset and the stage timings to the next stages.
+        """
+        request_state = {'timings': {}, 'deadline': deadline, 'log_sampled': self.sample_request_log()}
+        self.bind_request_state(request_state)
+        timings = request_state['timings']
+        self.check_deadline()
 
         # Starting timer for the full inference process
-        full_start = time.perf_counter()
+        request_state['full_start'] = time.perf_counter()
         
         # Executing the input decoding process
         decode_input_start = time.perf_counter()
         decoded_input, run_total = self.decode_input(indata=indata)
         assert not (self.server_configs['SERVER_MODE'] == 0 and run_total > 1), \
             f"AssertionError: server_mode is 0 and run_total is > 1, got server_mode: {self.server_configs['SERVER_MODE']} and run_total: {run_total}"
-        self.log(f"Dataset size: {run_total}")
+        self.log("Dataset size: %s", run_total)
         decode_input_end = time.perf_counter()
-        self.inference_timings['decode_input'] = decode_input_end - decode_input_start
-        self.log(f"Decode Input time: {self.inference_timings['decode_input'] * 1000:.2f} ms")
+        timings['decode_input'] = decode_input_end - decode_input_start
+        self.log("Decode Input time: %.2f ms", timings['decode_input'] * 1000)
 
         # Executing the dataset creation and preprocessing
         create_and_preprocess_start = time.perf_counter()
         dataset = self.create_and_preprocess(decoded_input=decoded_input, run_total=run_total)
         create_and_preprocess_end = time.perf_counter()
-        self.inference_timings['create_and_preprocess'] = create_and_preprocess_end - create_and_preprocess_start
-        self.log(f"Create and Preprocess time: {self.inference_timings['create_and_preprocess'] * 1000:.2f} ms")
+        timings['create_and_preprocess'] = create_and_preprocess_end - create_and_preprocess_start
+        self.log("Create and Preprocess time: %.2f ms", timings['create_and_preprocess'] * 1000)
         
         # Reshaping input data if in Latency Server Mode (self.server_configs['SERVER_MODE'] == 0)
         reshape_input_start = time.perf_counter()
         if self.server_configs['SERVER_MODE'] == 0:
             dataset = self.reshape_input(input=dataset)
         reshape_input_end = time.perf_counter()
-        self.inference_timings['reshape_input'] = reshape_input_end - reshape_input_start
-        self.log(f"Reshape input time: {self.inference_timings['reshape_input'] * 1000:.2f} ms")
+        timings['reshape_input'] = reshape_input_end - reshape_input_start
+        self.log("Reshape input time: %.2f ms", timings['reshape_input'] * 1000)
+
+        request_state['dataset'] = dataset
+        request_state['run_total'] = run_total
+        return request_state
+
+    def inference_execute(self, request_state):
+        """
+        Second inference stage, on the accelerator: experiment execution based on the server mode.
+        Stores the experiment output in request_state.
+        """
+        self.bind_request_state(request_state)
+        timings = request_state['timings']
+        dataset = request_state.pop('dataset')
+        run_total = request_state['run_total']
 
         # Running the experiment based on the server mode
+        self.check_deadline()
         experiment_start = time.perf_counter()
-        if self.server_configs['SERVER_MODE'] == 0:
+        if run_total == 0:
+            # Every item of the request was served from the result cache by experiment_server.py
+            exp_output = np.empty((0,) + tuple(self.experiment_configs.get('expected_output', (None,))[1:]))
+        elif self.server_configs['SERVER_MODE'] == 0:
             assert self.server_configs['BATCH_SIZE'] == 1, \
-                f"Batch size should be equal to 1 in cases where server_mode == 0, got {self.server_configs['BATCH_SIZE']}"
+                f"Batch size should be equal to 1 in cases where server_mode == 0 without dynamic batching, got {self.server_configs['BATCH_SIZE']}"
             exp_output = self.experiment_single(input=dataset, run_total=run_total)
         elif self.server_configs['SERVER_MODE'] == 1:
             exp_output = self.experiment_multiple(dataset=dataset, run_total=run_total)
         else:
             raise AssertionError(f"Server Mode is neither 0 nor 1 (LAT or THR), got {self.server_configs['SERVER_MODE']}")
         experiment_end = time.perf_counter()
-        self.inference_timings['experiment'] = experiment_end - experiment_start
-        self.log(f"Experiment time: {self.inference_timings['experiment'] * 1000:.2f} ms")
+        timings['experiment'] = experiment_end - experiment_start
+        self.log("Experiment time: %.2f ms", timings['experiment'] * 1000)
+
+        request_state['exp_output'] = exp_output
+
+    def inference_postprocess(self, request_state):
+        """
+        Third inference stage, host-side: output reshaping, data postprocessing, output encoding and
+        the post-inference operations (benchmarks, metrics, exporters).
+        Returns the encoded output.
+        """
+        self.bind_request_state(request_state)
+        timings = request_state['timings']
+        exp_output = request_state.pop('exp_output')
+        run_total = request_state['run_total']
 
         # Reshaping the experiment output
         reshape_output_start = time.perf_counter()
         exp_output = self.reshape_output(exp_output=exp_output, run_total=run_total)
         reshape_output_end = time.perf_counter()
-        self.inference_timings['reshape_output'] = reshape_output_end - reshape_output_start
-        self.log(f"Reshape output time: {self.inference_timings['reshape_output'] * 1000:.2f} ms")
+        timings['reshape_output'] = reshape_output_end - reshape_output_start
+        self.log("Reshape output time: %.2f ms", timings['reshape_output'] * 1000)
 
         # Post-processing the experiment output
         postprocess_start = time.perf_counter()
         output = self.postprocess(exp_output=exp_output, run_total=run_total)
         postprocess_end = time.perf_counter()
-        self.inference_timings['postprocess'] = postprocess_end - postprocess_start
-        self.log(f"Postprocess time: {self.inference_timings['postprocess'] * 1000:.2f} ms")
+        timings['postprocess'] = postprocess_end - postprocess_start
+        self.log("Postprocess time: %.2f ms", timings['postprocess'] * 1000)
 
         # Encoding the final output
         encode_output_start = time.perf_counter()
         encoded_output = self.encode_output(output=output)
         encode_output_end = time.perf_counter()
-        self.inference_timings['encode_output'] = encode_output_end - encode_output_start
-        self.log(f"Encode Output time: {self.inference_timings['encode_output'] * 1000:.2f} ms")
+        timings['encode_output'] = encode_output_end - encode_output_start
+        self.log("Encode Output time: %.2f ms", timings['encode_output'] * 1000)
 
         # Calculating and storing the full elapsed time for the inference
         full_end = time.perf_counter()
-        self.inference_timings['full_inference'] = full_end - full_start
-
-        # Various post-inference operations
+        timings['full_inference'] = full_end - request_state['full_start']
+
+        # Various post-inference operations, on the timings of this request
+        self.inference_timings.update(timings)
+        if run_total == 0:
+            self.log('Every item served from the result cache, no metrics to report')
+            return encoded_output
+        if self.warming_up:
+            return encoded_output
+        self.stage_histograms.record(mode='LAT' if self.server_configs['SERVER_MODE'] == 0 else 'THR', timings=timings)
         self.benchmarks(run_total=run_total)
-        self.redis_create_send()
         self.save_metrics()
         self.prints()
         return encoded_output
 
+    def inference_batch(self, indata_list):
+        """
+        Handle the inference process for a batch of single-item requests merged by the dynamic batcher of flask_server.py.
+        Works only in Latency Server Mode (self.server_configs['SERVER_MODE'] == 0) with DYNAMIC_BATCHING enabled.
+        Each request is decoded and preprocessed on its own, the items are stacked into one batch padded up to BATCH_SIZE
+        and executed with a single experiment_single call, and the outputs are split back and encoded per request.
+        Every merged request has its own request_state, bound for its decoding, preprocessing, postprocessing and
+        encoding; only the experiment runs under a state of the whole batch.
+        Returns a list of encoded outputs, in the same order as indata_list.
+        """
+        num_requests = len(indata_list)
+        log_sampled = self.sample_request_log()
+        request_states = [{'timings': {}, 'log_sampled': log_sampled} for _ in range(num_requests)]
+        batch_state = {'timings': {}, 'log_sampled': log_sampled}
+        self.bind_request_state(batch_state)
+        assert self.server_configs['SERVER_MODE'] == 0, \
+            f"Dynamic batching works only when server_mode is 0, got server_mode: {self.server_configs['SERVER_MODE']}"
+        assert 0 < num_requests <= self.server_configs['BATCH_SIZE'], \
+            f"Number of batched requests should be between 1 and {self.server_configs['BATCH_SIZE']}, got {num_requests}"
+
+        # Starting timer for the full inference process
+        full_start = time.perf_counter()
+
+        try:
+            # Executing the input decoding process for every request
+            decode_input_start = time.perf_counter()
+            decoded_inputs = []
+            for indata, request_state in zip(indata_list, request_states):
+                self.bind_request_state(request_state)
+                decoded_input, run_total = self.decode_input(indata=indata)
+                assert run_total == 1, f"Dynamic batching merges single-item requests, got run_total: {run_total}"
+                decoded_inputs.append(decoded_input)
+            self.bind_request_state(batch_state)
+            self.log("Batched requests: %s", num_requests)
+            decode_input_end = time.perf_counter()
+            self.inference_timings['decode_input'] = decode_input_end - decode_input_start
+            self.log("Decode Input time: %.2f ms", self.inference_timings['decode_input'] * 1000)
+
+            # Executing the dataset creation and preprocessing for every request
+            create_and_preprocess_start = time.perf_counter()
+            datasets = []
+            for decoded_input, request_state in zip(decoded_inputs, request_states):
+                self.bind_request_state(request_state)
+                datasets.append(self.create_and_preprocess(decoded_input=decoded_input, run_total=1))
+            self.bind_request_state(batch_state)
+            create_and_preprocess_end = time.perf_counter()
+            self.inference_timings['create_and_preprocess'] = create_and_preprocess_end - create_and_preprocess_start
+            self.log("Create and Preprocess time: %.2f ms", self.inference_timings['create_and_preprocess'] * 1000)
+
+            # Reshaping every input and stacking them into one batch, zero-padded up to BATCH_SIZE
+            reshape_input_start = time.perf_counter()
+            batch = None
+            for i, dataset in enumerate(datasets):
+                item = self.reshape_input(input=dataset, batch_size=1)
+                if batch is None:
+                    batch = self.batch_buffer(item_shape=item.shape[1:], dtype=item.dtype)
+                batch[i] = item[0]
+            batch[num_requests:] = 0
+            reshape_input_end = time.perf_counter()
+            self.inference_timings['reshape_input'] = reshape_input_end - reshape_input_start
+            self.log("Reshape input time: %.2f ms", self.inference_timings['reshape_input'] * 1000)
+
+            # Running the experiment once for the whole batch
+            experiment_start = time.perf_counter()
+            exp_output = self.experiment_single(input=batch, run_total=num_requests)
+            experiment_end = time.perf_counter()
+            self.inference_timings['experiment'] = experiment_end - experiment_start
+            self.log("Experiment time: %.2f ms", self.inference_timings['experiment'] * 1000)
+
+            # Dropping the padded outputs and reshaping the experiment output
+            reshape_output_start = time.perf_counter()
+            exp_output = self.reshape_output(exp_output=exp_output[:num_requests], run_total=num_requests)
+            reshape_output_end = time.perf_counter()
+            self.inference_timings['reshape_output'] = reshape_output_end - reshape_output_start
+            self.log("Reshape output time: %.2f ms", self.inference_timings['reshape_output'] * 1000)
+
+            # Post-processing the experiment output of every request
+            postprocess_start = time.perf_counter()
+            outputs = []
+            for i, request_state in enumerate(request_states):
+                self.bind_request_state(request_state)
+                outputs.append(self.postprocess(exp_output=exp_output[i:i + 1], run_total=1))
+            self.bind_request_state(batch_state)
+            postprocess_end = time.perf_counter()
+            self.inference_timings['postprocess'] = postprocess_end - postprocess_start
+            self.log("Postprocess time: %.2f ms", self.inference_timings['postprocess'] * 1000)
+
+            # Encoding the final output of every request
+            encode_output_start = time.perf_counter()
+            encoded_outputs = []
+            for output, request_state in zip(outputs, request_states):
+                self.bind_request_state(request_state)
+                encoded_outputs.append(self.encode_output(output=output))
+            self.bind_request_state(batch_state)
+            encode_output_end = time.perf_counter()
+            self.inference_timings['encode_output'] = encode_output_end - encode_output_start
+            self.log("Encode Output time: %.2f ms", self.inference_timings['encode_output'] * 1000)
+        except Exception:
+            # Release the per-request resources of every merged request, the caller only sees the batch state
+            for request_state in request_states:
+                self.bind_request_state(request_state)
+                self.cleanup_request()
+            self.bind_request_state(batch_state)
+            raise
+
+        # Calculating and storing the full elapsed time for the inference
+        full_end = time.perf_counter()
+        self.inference_timings['full_inference'] = full_end - full_start
+
+        if self.warming_up:
+            return encoded_outputs
+
+        # Various post-inference operations, the batch is accounted as one dataset of num_requests items
+        self.stage_histograms.record(mode='LAT_BATCHED', timings={stage: self.inference_timings[stage] for stage in utils.INFERENCE_STAGES})
+        self.benchmarks(run_total=num_requests)
+        self.save_metrics()
+        self.prints()
+        return encoded_outputs
+
     def decode_input(self, indata):
         """
         Decode input data. Must be overridden by experiment_server.py (BaseExperimentServer).
@@ -248,19 +792,24 @@ class BaseServer:
         Gets decoded_input from decode_input() and outputs dataset.
         dataset NEEDS to be:
         a) a numpy.array in Latency Server Mode (self.server_configs['SERVER_MODE'] == 0).
-        b) a tf.data.Dataset in Throughput Server Mode (self.server_configs['SERVER_MODE'] == 1).
+        b) a tf.data.Dataset in Throughput Server Mode (self.server_configs['SERVER_MODE'] == 1), or an iterator of
+           numpy batches if self.server_configs['NUMPY_DATASET'] is set by the {Pair}Server (CPU, ARM, GPU, AGX),
+           so that these pairs never import TensorFlow.
         """
         raise AssertionError('Forgot to overload create_and_preprocess. Must be overridden by experiment_server.py (BaseExperimentServer).')
 
-    def reshape_input(self, input):
+    def reshape_input(self, input, batch_size=None):
         """
         Reshape input data if necessary, works only in Latency Server Mode (self.server_configs['SERVER_MODE'] == 0).
         Takes a numpy array as input and returns a reshaped numpy array as output.
         It reshapes the input based on the `expected_input` field in the self.experiment_configs in the set_experiment_configs method of experiment_server.py.
         self.experiment_configs['expected_input'] must be batched input, e.g., (None, 224, 224, 3).
+        batch_size defaults to BATCH_SIZE; inference_batch passes 1 to reshape each merged request on its own.
         """
+        if batch_size is None:
+            batch_size = self.server_configs['BATCH_SIZE']
         if 'expected_input' in self.experiment_configs:
-            batched_expected_input = (self.server_configs['BATCH_SIZE'],) + self.experiment_configs['expected_input'][1:]
+            batched_expected_input = (batch_size,) + self.experiment_configs['expected_input'][1:]
             input = np.reshape(input, batched_expected_input)
         return input
 
@@ -276,10 +825,83 @@ class BaseServer:
         """
         Execute the experiment for multiple input data. Works only in Throughput Server Mode (self.server_configs['SERVER_MODE'] == 1).
         Must be overridden by {pair}_server.py ({Pair}Server).
-        Takes a tf.data.Dataset as input and returns a numpy array as output.
+        Takes a tf.data.Dataset (or an iterator of numpy batches, see create_and_preprocess) as input and returns a numpy array as output.
         """
         raise AssertionError('Forgot to overload experiment_multiple. Must be overridden by {pair}_server.py ({Pair}Server).')
 
+    def execute_batches(self, dataset, run_total, run_batch):
+        """
+        Batch execution engine of experiment_multiple, so each {Pair}Server only supplies run_batch.
+        run_batch(x) executes one numpy batch of BATCH_SIZE items on the AI-framework/platform pair and returns its output.
+        The last partial batch is zero-padded in the reused input buffer, and the valid outputs of every batch are
+        written directly into one output of run_total items, preallocated with the shape of expected_output if set.
+        With PARALLEL_BATCHES > 1, up to PARALLEL_BATCHES batches run concurrently on the batch_pool threads, so
+        run_batch must be thread-safe (e.g., take a free interpreter from a pool); at most twice as many batches are
+        in flight, and their outputs are written in the dataset order.
+        Checks the deadline of the request between batches.
+        Takes a tf.data.Dataset (or any iterable of batches) as input and returns a numpy array as output.
+        """
+        batch_size = self.server_configs['BATCH_SIZE']
+        parallel_batches = self.server_configs['PARALLEL_BATCHES']
+        if parallel_batches > 1 and self.batch_pool is None:
+            self.batch_pool = concurrent.futures.ThreadPoolExecutor(max_workers=parallel_batches, thread_name_prefix='batch')
+        exp_output = None
+        pending = collections.deque()  # (future, offset, valid outputs) of the batches in flight, in dataset order
+
+        def write_output(output_data, offset, valid_outputs):
+            nonlocal exp_output
+            output_data = np.asarray(output_data)[:valid_outputs]
+            if exp_output is None:
+                item_shape = tuple(self.experiment_configs['expected_output'][1:]) if 'expected_output' in self.experiment_configs else output_data.shape[1:]
+                exp_output = np.empty(shape=(run_total,) + item_shape, dtype=output_data.dtype)
+            exp_output[offset:offset + valid_outputs] = output_data.reshape((valid_outputs,) + exp_output.shape[1:])
+
+        done = 0
+        try:
+            for element in dataset:
+                if done == run_total:
+                    break
+                # Stop between batches if the deadline of the request has passed
+                self.check_deadline()
+                x_input = np.asarray(element)
+                valid_outputs = min(x_input.shape[0], run_total - done)
+                if valid_outputs < batch_size:  # Process any remainder data, padded up to BATCH_SIZE
+                    x_input = self.pad_batch(x_input[:valid_outputs])
+
+                if parallel_batches > 1:
+                    pending.append((self.batch_pool.submit(run_batch, x_input), done, valid_outputs))
+                    if len(pending) >= 2 * parallel_batches:
+                        future, offset, valid = pending.popleft()
+                        write_output(future.result(), offset, valid)
+                else:
+                    write_output(run_batch(x_input), done, valid_outputs)
+                done += valid_outputs
+            while pending:
+                future, offset, valid = pending.popleft()
+                write_output(future.result(), offset, valid)
+        finally:
+            # On an error (e.g., the deadline), the batches in flight still complete before the input buffer is reused
+            concurrent.futures.wait([future for future, _, _ in pending])
+        assert done == run_total, f"The dataset should contain {run_total} items, got {done}"
+        return exp_output
+
+    def batch_buffer(self, item_shape, dtype):
+        """
+        Return the reused input buffer of BATCH_SIZE items, allocated (zeroed) on first use
+        and again only if BATCH_SIZE, the item shape or the dtype change.
+        """
+        shape = (self.server_configs['BATCH_SIZE'],) + tuple(item_shape)
+        if self.input_buffer is None or self.input_buffer.shape != shape or self.input_buffer.dtype != dtype:
+            self.input_buffer = np.zeros(shape=shape, dtype=dtype)
+        return self.input_buffer
+
+    def pad_batch(self, x_input):
+        """Copy a partial batch into the reused input buffer and zero the remaining rows. Returns the buffer."""
+        batch = self.batch_buffer(item_shape=x_input.shape[1:], dtype=x_input.dtype)
+        batch[:x_input.shape[0]] = x_input
+        batch[x_input.shape[0]:] = 0
+        return batch
+
     def reshape_output(self, exp_output, run_total):
         """
         Reshape experiment output if necessary.
@@ -321,43 +943,38 @@ class BaseServer:
         self.inference_metrics['throughput'] = run_total / full_time
         self.inference_metrics['dataset_size'] = run_total
 
-    def redis_create_send(self):
-        """Create metric data and send it to Redis."""
-        if self.server_configs['SEND_METRICS']:
-            create_start = time.perf_counter()
-            # Passing None means that the function will get the value from the environment
-            keys_metrics_tuples = utils.fill_redis_verbose(aif_characteristics_dict=self.aif_characteristics,
-                            AIF_timestamp=self.server_configs['AIF_timestamp'], inference_metrics_dict=self.inference_metrics)
-            create_end = time.perf_counter()
-            send_start = time.perf_counter()
-            try:
-                utils.send_redis_verbose(self.my_redis, keys_metrics_tuples)
-            except Exception as e:
-                self.log(f"Could not send data to Redis: {str(e)}")
-            send_end = time.perf_counter()
-            create_elapsed_time = create_end - create_start
-            send_elapsed_time = send_end - send_start
-            self.inference_timings['redis_create'] = create_elapsed_time
-            self.inference_timings['redis_send'] = send_elapsed_time
-            self.log(f"Redis Create and Send time: {create_elapsed_time * 1000:.2f} ms , {send_elapsed_time * 1000:.2f} ms")
-        else:
-            self.log('Send Redis Metrics -> False')
-
     def save_metrics(self):
-        """Save metrics on the server, to be requested from the metrics endpoint."""
+        """Save metrics on the server, to be requested from the metrics endpoint, and export them."""
         start = time.perf_counter()
-        self.my_metrics_list.append(utils.create_metric_dictionary(aif_characteristics_dict=self.aif_characteristics,
-                            AIF_timestamp=self.server_configs['AIF_timestamp'], inference_metrics_dict=self.inference_metrics))
+        metric = utils.create_metric_dictionary(aif_characteristics_dict=self.aif_characteristics,
+                            AIF_timestamp=self.server_configs['AIF_timestamp'], inference_metrics_dict=self.inference_metrics)
+        self.my_metrics_list.append(metric)
         end = time.perf_counter()
         elapsed_time = end - start
         self.inference_timings['save_metrics'] = elapsed_time
-        self.log(f"Save metrics time: {elapsed_time * 1000:.2f} ms")
+        self.log("Save metrics time: %.2f ms", elapsed_time * 1000)
+        self.export_metrics(metric)
+
+    def export_metrics(self, metric):
+        """Export the metric dictionary of this inference to every metrics exporter."""
+        if not self.metrics_exporters:
+            self.log('Export Metrics -> False')
+            return
+        start = time.perf_counter()
+        for exporter in self.metrics_exporters:
+            try:
+                exporter.export(metric)
+            except Exception as e:
+                self.logger.warning("Could not export metrics to %s: %s", exporter.name, e)  # Logged even if the request is not sampled
+        elapsed_time = time.perf_counter() - start
+        self.inference_timings['export_metrics'] = elapsed_time
+        self.log("Export metrics time: %.2f ms", elapsed_time * 1000)
     
     def prints(self):
         """Print processing latency and throughput metrics."""
         self.log(' ')
-        self.log(f"\tProcessing Latency (data preparation + execution) :  \t{self.inference_metrics['processing_latency']:.2f} ms ({self.inference_metrics['data_preparation_latency']:.2f} + {self.inference_metrics['execution_latency']:.2f})")
-        self.log(f"\tTotal throughput (batch size) :                      \t{self.inference_metrics['throughput']:.2f} fps ({self.inference_metrics['batch_size']})")
+        self.log("\tProcessing Latency (data preparation + execution) :  \t%.2f ms (%.2f + %.2f)", self.inference_metrics['processing_latency'], self.inference_metrics['data_preparation_latency'], self.inference_metrics['execution_latency'])
+        self.log("\tTotal throughput (batch size) :                      \t%.2f fps (%s)", self.inference_metrics['throughput'], self.inference_metrics['batch_size'])
         
     def platform_preprocess(self, data):
         """Preprocess the input, specific to the platform requirement, not the experiment ones. Must be overridden by {pair}_server.py ({Pair}Server)."""
@@ -0,0 +1,130 @@
+#!/usr/bin/python3
+"""
+Author: Aimilios Leftheriotis
+Affiliations: Microlab@NTUA, VLSILab@UPatras
+
+This module is a standalone benchmark of the per-request logging overhead of BaseServer on the inference hot path.
+
+Overview:
+- Replays the log calls of one Latency Server Mode request of BaseServer.inference (stage timings, metrics and prints)
+  against the handlers of logconfig.ini (a FileHandler and a StreamHandler), for a number of simulated requests.
+- Measures the time spent in the request thread per request, for each logging mode:
+  1. sync, f-string: the handlers run in the request thread and the messages are formatted eagerly (the original behavior).
+  2. sync, lazy: the handlers run in the request thread and the messages are formatted by logging, with BaseServer.log.
+  3. async, lazy: ASYNC_LOGGING, the request thread only enqueues the records for the listener thread.
+  4. async, lazy, sampled: ASYNC_LOGGING and LOG_SAMPLE_RATE, only one in every N requests is logged.
+
+Usage:
+- python3 benchmark_logging.py [--requests 20000] [--sample-rate 10] [--log-config logconfig.ini]
+- Runs outside the container, next to base_server.py and utils.py. The log file is written to a temporary directory
+  and the console output is discarded.
+"""
+
+import os
+import sys
+import time
+import argparse
+import tempfile
+import threading
+import itertools
+import logging
+import logging.config
+import base_server
+import utils
+
+class LoggingOnlyServer(base_server.BaseServer):
+    """BaseServer with only the state used by its log method, without a model or the environment configuration."""
+    def __init__(self, logger, log_sample_rate):
+        self.logger = logger
+        self.request_local = threading.local()
+        self.server_configs = {'LOG_SAMPLE_RATE': log_sample_rate}
+        self.request_counter = itertools.count()
+
+# Representative stage timings (seconds) and metrics of one request
+timings = {'decode_input': 0.0012, 'create_and_preprocess': 0.0043, 'reshape_input': 0.0001, 'experiment': 0.0187,
+           'reshape_output': 0.0001, 'postprocess': 0.0029, 'encode_output': 0.0015}
+metrics = {'processing_latency': 28.8, 'data_preparation_latency': 10.1, 'execution_latency': 18.7, 'throughput': 34.7, 'batch_size': 1}
+
+def request_eager(server):
+    """The log calls of one request, formatted eagerly with f-strings."""
+    server.logger.info(f"Dataset size: {1}")
+    server.logger.info(f"Decode Input time: {timings['decode_input'] * 1000:.2f} ms")
+    server.logger.info(f"Create and Preprocess time: {timings['create_and_preprocess'] * 1000:.2f} ms")
+    server.logger.info(f"Reshape input time: {timings['reshape_input'] * 1000:.2f} ms")
+    server.logger.info(f"Experiment time: {timings['experiment'] * 1000:.2f} ms")
+    server.logger.info(f"Reshape output time: {timings['reshape_output'] * 1000:.2f} ms")
+    server.logger.info(f"Postprocess time: {timings['postprocess'] * 1000:.2f} ms")
+    server.logger.info(f"Encode Output time: {timings['encode_output'] * 1000:.2f} ms")
+    server.logger.info('Export Metrics -> False')
+    server.logger.info(f"Save metrics time: {0.01:.2f} ms")
+    server.logger.info(' ')
+    server.logger.info(f"\tProcessing Latency (data preparation + execution) :  \t{metrics['processing_latency']:.2f} ms ({metrics['data_preparation_latency']:.2f} + {metrics['execution_latency']:.2f})")
+    server.logger.info(f"\tTotal throughput (batch size) :                      \t{metrics['throughput']:.2f} fps ({metrics['batch_size']})")
+
+def request_lazy(server):
+    """The log calls of one request through BaseServer.log, as in base_server.py."""
+    server.bind_request_state({'timings': {}, 'log_sampled': server.sample_request_log()})
+    server.log("Dataset size: %s", 1)
+    server.log("Decode Input time: %.2f ms", timings['decode_input'] * 1000)
+    server.log("Create and Preprocess time: %.2f ms", timings['create_and_preprocess'] * 1000)
+    server.log("Reshape input time: %.2f ms", timings['reshape_input'] * 1000)
+    server.log("Experiment time: %.2f ms", timings['experiment'] * 1000)
+    server.log("Reshape output time: %.2f ms", timings['reshape_output'] * 1000)
+    server.log("Postprocess time: %.2f ms", timings['postprocess'] * 1000)
+    server.log("Encode Output time: %.2f ms", timings['encode_output'] * 1000)
+    server.log('Export Metrics -> False')
+    server.log("Save metrics time: %.2f ms", 0.01)
+    server.log(' ')
+    server.log("\tProcessing Latency (data preparation + execution) :  \t%.2f ms (%.2f + %.2f)", metrics['processing_latency'], metrics['data_preparation_latency'], metrics['execution_latency'])
+    server.log("\tTotal throughput (batch size) :                      \t%.2f fps (%s)", metrics['throughput'], metrics['batch_size'])
+
+def run_mode(log_config, request_function, num_requests, async_logging, log_sample_rate):
+    """
+    Configure logging for one mode and return the mean time (us) per request spent in the request thread,
+    and the mean time per request including the flush of the queued records.
+    """
+    logging.config.fileConfig(log_config, disable_existing_loggers=False)
+    listeners = utils.enable_async_logging(['sampleLogger', '']) if async_logging else []
+    server = LoggingOnlyServer(logging.getLogger('sampleLogger'), log_sample_rate)
+    start = time.perf_counter()
+    for _ in range(num_requests):
+        request_function(server)
+    request_end = time.perf_counter()
+    for listener in listeners:
+        listener.stop()
+    flush_end = time.perf_counter()
+    for handler in logging.getLogger('sampleLogger').handlers + logging.getLogger().handlers:
+        handler.close()
+    return (request_end - start) / num_requests * 1e6, (flush_end - start) / num_requests * 1e6
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the per-request logging overhead of BaseServer.')
+    parser.add_argument('--requests', type=int, default=20000, help='Number of simulated requests per mode')
+    parser.add_argument('--sample-rate', type=int, default=10, help='LOG_SAMPLE_RATE of the sampled mode')
+    parser.add_argument('--log-config', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'logconfig.ini'))
+    args = parser.parse_args()
+
+    modes = [
+        ('sync, f-string', request_eager, False, 1),
+        ('sync, lazy', request_lazy, False, 1),
+        ('async, lazy', request_lazy, True, 1),
+        (f"async, lazy, sampled 1/{args.sample_rate}", request_lazy, True, args.sample_rate)
+    ]
+    results = []
+    stdout = sys.stdout
+    with tempfile.TemporaryDirectory() as log_dir, open(os.devnull, 'w') as devnull:
+        os.environ['LOG_FILE'] = os.path.join(log_dir, 'AIF_log.log')
+        # The StreamHandler of logconfig.ini writes to sys.stdout when it is configured
+        sys.stdout = devnull
+        try:
+            for name, request_function, async_logging, log_sample_rate in modes:
+                results.append((name,) + run_mode(args.log_config, request_function, args.requests, async_logging, log_sample_rate))
+        finally:
+            sys.stdout = stdout
+
+    print(f"{'Mode':<32}{'Request thread (us/request)':>30}{'With flush (us/request)':>26}")
+    for name, request_time, total_time in results:
+        print(f"{name:<32}{request_time:>30.2f}{total_time:>26.2f}")
+
+if __name__ == '__main__':
+    main()
@@ -20,17 +20,137 @@ Functionality:
 
 2. Metric Service ('/api/metrics'):
    - Accepts POST requests with parameters to fetch metrics.
-   - Enqueues the request for asynchronous processing.
+   - Served directly by the request handler from a lock-protected snapshot of the metrics list, without going
+     through the inference queue, so it never waits behind an inference.
    - Returns either all metrics or a specified number of recent metrics based on the client's request.
+   - An optional 'since' cursor returns only the metrics recorded after a previous call. The next cursor is returned
+     as 'metrics_cursor' in the last element of the response, next to the once_timings.
+   - Optional 'start_time' and 'end_time' (seconds since the epoch) return only the metrics of a wall-clock range.
+   - With 'METRICS_STORE_PATH', the metrics are kept in an SQLite file (utils.SQLiteMetricsList) instead of memory,
+     so the history survives container restarts.
+
+3. Aggregate Metrics Service ('/api/metrics/aggregate'):
+   - Accepts POST requests with an optional 'window' (seconds) or 'number' of recent metrics.
+   - Returns the count, and the mean, p50, p95 and p99 of the processing, data preparation and execution latency and
+     of the throughput, computed on the metrics store (utils.MetricsRing), so clients do not download the raw metrics.
+
+4. Stats Service ('/api/stats'):
+   - Accepts GET requests.
+   - Returns the count, mean, min, max and p50/p90/p95/p99/p99.9 latencies, in ms, of every inference stage, grouped
+     by server mode ('LAT', 'THR', or 'LAT_BATCHED' for dynamic batches), from the histograms of BaseServer.
+
+5. Prometheus Service ('/metrics'):
+   - Accepts GET requests, if 'prometheus' is in 'METRICS_EXPORTERS' (404 otherwise).
+   - Returns the inference and item counters, the latency histograms and the throughput and batch size gauges of every
+     AIF instance, in the Prometheus text exposition format.
 
 Logging:
 - The logging configuration is specified by the 'LOG_CONFIG' environment variable.
 - The module sets up loggers for both file and console output.
+- With 'ASYNC_LOGGING', the handlers run on background threads (utils.enable_async_logging), so the request threads
+  only enqueue the log records. 'LOG_SAMPLE_RATE' (BaseServer) logs only one in every N requests in full.
+
+Batch Size Autotuning:
+- With 'BATCH_AUTOTUNE', every MyServer (create_server) sweeps the candidate batch sizes of 'BATCH_AUTOTUNE_CANDIDATES'
+  with synthetic inputs at startup, and runs with the highest-throughput one under 'BATCH_AUTOTUNE_SLO_MS'.
+- The sweep runs once per model; the other replicas reuse its result. The choice and the measured curve are reported
+  in once_timings['batch_autotune'].
+
+Thread Autotuning:
+- With 'THREAD_AUTOTUNE', the TFLite pairs (CpuServer, ArmServer) sweep their number of threads at startup, within the
+  CPUs available to a replica (CPU affinity and cgroup quota, divided by 'NUM_REPLICAS' and 'NUM_INTERPRETERS'), and run with the
+  highest-throughput one. CpuTfServer, whose TensorFlow threads are fixed once, is only capped to these CPUs.
+  With the other pairs, 'THREAD_AUTOTUNE' stops the process at startup, before any worker starts.
+- The choice and the measured curve are reported in once_timings['thread_autotune'], next to NUM_THREADS.
+
+Steady-State Warm-Up:
+- With 'WARM_UP_MAX_ITERATIONS', every MyServer (create_server) repeats the code path of its server mode, with the
+  'WARM_UP_SAMPLE' request payload or synthetic inputs, until the latency converges, before it serves requests.
+- The warm-up requests are not recorded in the metrics; the latency curve is reported in once_timings['steady_warm_up'].
+
+Metrics Exporters:
+- 'METRICS_EXPORTERS' selects the exporters of the metrics of every inference, shared by all replicas: 'redis'
+  (also enabled by 'SEND_METRICS'), 'file' (a size-rotated JSON Lines or CSV file) and 'prometheus' (the /metrics endpoint).
+  Their counters are reported under 'metrics_exporters' by the metric service.
+- With 'ASYNC_REDIS_EXPORT', the Redis metrics of all replicas are sent by one background exporter (utils.RedisExporter).
+- With 'REDIS_AGGREGATE_WINDOW_S', the Redis metrics are pre-aggregated in wall-clock windows (utils.WindowedAggregator)
+  and sent as one sample set (mean, count, sum, min, max, p50, p95, p99) per metric per window.
+
+Startup Profiling:
+- The startup phases of the process are timed from the start of the process (utils.StartupProfiler): the interpreter,
+  the imports of Flask and of the server modules, the readiness of every replica ('time_to_ready') and the first
+  inference response ('time_to_first_response'). They are reported next to the once_timings of the metric service,
+  together with the per-server 'load_env', 'create_exporters', 'init' and 'warm_up' timings.
+- redistimeseries is imported only when metrics are sent, and the TFLite pairs prefer tflite_runtime over TensorFlow.
+
+Serving Modes:
+- Selected with the 'SERVING_MODE' environment variable.
+- 'flask' (default): The Flask app, served by the Werkzeug server with one thread per connection.
+- 'asyncio': An asyncio HTTP/1.1 server with the same endpoints and contract as the Flask app, and HTTP keep-alive.
+  Connections are handled on a single event loop, which bridges into the worker threads through the request queue
+  and awaits each request's future, so no thread is parked per open connection.
 
 Queue and Threading:
-- A single queue is used to manage requests for both services.
-- A worker thread processes the requests from the queue.
-- Condition variables are used to synchronize request processing and result retrieval.
+- A single queue is used to manage the inference requests.
+- A pool of 'NUM_REPLICAS' worker threads (default 1) processes the requests from the queue. Each worker owns its own
+  MyServer replica (interpreter, session, model or DPU runners), so each request goes to whichever replica is free.
+- All replicas append their metrics to the same process-wide metrics list (utils.shared_metrics_list).
+- Each request carries its own concurrent.futures.Future, which the worker completes with the result, so a finished
+  request wakes only its own caller.
+
+Admission Control:
+- The request queue is bounded to 'MAX_QUEUE_SIZE' inference requests (0, the default, means unbounded).
+- The queueing delay of a new request is estimated from the queue depth, the number of replicas and a moving
+  average of the recent per-request service times (derived from the 'full_inference' timings).
+- A request is rejected immediately with 429 when the queue is full, or with 503 when its estimated queueing delay
+  exceeds 'ADMISSION_MAX_DELAY_MS' (0, the default, disables the check) or the remaining time to its deadline.
+  All carry a Retry-After hint.
+- The queue depth, the delay estimate and the admission counters are reported under 'admission' in the last
+  element of the metric service response.
+
+Request Deadlines:
+- A client may send the 'X-Request-Deadline-Ms' header: the time budget of the request in milliseconds,
+  counted from its arrival. The deadline is carried with the request in the queue.
+- An expired request is answered with 504 instead of being processed: the dynamic batcher drops it from the
+  batch, and BaseServer raises DeadlineExceeded before decoding, before the experiment, and between the
+  batches of experiment_multiple in Throughput Server Mode.
+- Expirations are counted under 'admission' ('expired') in the last element of the metric service response.
+
+Result Cache:
+- With RESULT_CACHE enabled in BaseServer, the responses of successful inference requests are cached, keyed on
+  the SHA-256 of the request payload and the model, with its number of completed hot swaps. A request whose
+  payload is cached is answered directly by the request handler, without entering the request queue.
+- The cache is shared with the per-item caching of experiment_server.py (e.g., the images of CLASSIFICATION_THR),
+  and its hit/miss counters are reported under 'result_cache' in the last element of the metric service response.
+
+Model Registry:
+- Besides the default model ('MODEL_NAME'), a container can serve the models listed in 'MODELS' as
+  'name=path' pairs separated by commas, addressed by '/api/infer/<name>' or by the 'X-Model-Name' header.
+- Each replica keeps a ModelRegistry of MyServer instances, one per model. A listed model is loaded and warmed up by
+  its first request, and the least recently used listed models are evicted when the size of the loaded model files
+  exceeds 'MODEL_MEMORY_BUDGET_MB' (0, the default, means unlimited). The default model is never evicted.
+- All models share the experiment_server.py of the container, so they must accept the same inputs and outputs
+  (e.g., variants of the same network, re-quantized or re-converted).
+
+Hot Model Swap ('/api/admin/swap'):
+- Accepts POST requests with a JSON body {"model_path": ..., "model": ...} to replace the artifact of the default
+  model (or of the listed model "model") without restarting the container.
+- A background thread loads and warms up one new MyServer per replica while the old ones keep serving. Each worker
+  then swaps its server between two requests, after the requests in flight in its pipeline have drained.
+- The load, warm-up, drain and total swap times are reported in the once_timings of the new servers.
+
+Pipelined Inference:
+- Enabled with the 'PIPELINED_INFERENCE' environment variable.
+- Each replica runs the three inference stages of BaseServer (inference_preprocess, inference_execute and
+  inference_postprocess) on three threads connected by queues bounded to 'PIPELINE_QUEUE_SIZE' requests, so the
+  host-side stages of the neighbouring requests overlap with the experiment execution of the current one.
+- Cannot be combined with dynamic batching.
+
+Dynamic Batching:
+- Enabled with the 'DYNAMIC_BATCHING' environment variable, in Latency Server Mode only.
+- The worker merges concurrent single-item inference requests into one batch of up to BATCH_SIZE items.
+- A batch is closed when it is full or when its oldest request has waited 'MAX_BATCH_DELAY_MS' in the queue.
+- The batch is executed with MyServer.inference_batch and each output is sent back to its own caller.
 
 Usage:
 - The server is started with the host and port specified by the 'SERVER_IP' and 'SERVER_PORT' environment variables.
@@ -44,98 +164,845 @@ This module can be extended and customized to support additional services or int
 
 
 # Import necessary libraries and modules
+import time
+startup_import_start = time.perf_counter()  # Start of the imports, for the startup profiler
 import os
 import logging
 import logging.config
 import json
 from flask import Flask, request, Response
-import uuid
 import queue
 import threading
+import asyncio
+import concurrent.futures
+import functools
+import math
+import atexit
+import traceback
+from collections import OrderedDict
+from http import HTTPStatus
+server_import_start = time.perf_counter()
 import my_server  # Import custom modules for the server's functionality and utility functions
+import base_server
 import utils
 
+# Time the startup phases of the process, up to the imports of the AI-framework runtimes
+startup_profiler = utils.shared_startup_profiler()
+startup_profiler.record('startup_interpreter', startup_profiler.process_start, startup_import_start)
+startup_profiler.record('startup_import_flask', startup_import_start, server_import_start)
+startup_profiler.record('startup_import_server', server_import_start)
+
+class AdmissionController:
+    """
+    Bounded admission control for the inference service.
+    Keeps an exponentially weighted moving average of the per-request service time, estimates the queueing delay of
+    a new request from it, and decides whether the request is admitted to the request queue.
+    """
+    def __init__(self, max_queue_size, max_queueing_delay, smoothing=0.2):
+        self.max_queue_size = max_queue_size  # 0 means unbounded
+        self.max_queueing_delay = max_queueing_delay  # Seconds, 0 disables the delay check
+        self.smoothing = smoothing
+        self.service_time = None
+        self.lock = threading.Lock()
+        self.counters = {
+            'admitted': 0,
+            'rejected_queue_full': 0,
+            'rejected_queueing_delay': 0,
+            'rejected_deadline': 0,
+            'expired': 0
+        }
+
+    def record_service_time(self, service_time):
+        """Update the moving average with the service time (in seconds) of one completed request."""
+        with self.lock:
+            if self.service_time is None:
+                self.service_time = service_time
+            else:
+                self.service_time += self.smoothing * (service_time - self.service_time)
+
+    def estimate_queueing_delay(self):
+        """Estimate, in seconds, how long a request enqueued now waits until its inference completes."""
+        if self.service_time is None:
+            return 0.0
+        return (request_queue.qsize() + 1) * self.service_time / max(len(replicas), 1)
+
+    def count(self, counter):
+        """Increment one of the admission counters."""
+        with self.lock:
+            self.counters[counter] += 1
+
+    def rejection(self, status, counter, retry_after):
+        """Count a rejected request and build its response, with a Retry-After hint in whole seconds."""
+        self.count(counter)
+        return Response(response=json.dumps({'status': HTTPStatus(status).phrase}), status=status, mimetype='application/json',
+                        headers={'Retry-After': str(max(1, math.ceil(retry_after)))})
+
+    def submit(self, request_dict):
+        """
+        Enqueue an inference request for the worker threads if it is admitted.
+        Returns (future, None) with the concurrent.futures.Future that will hold the result,
+        or (None, response) with the 429 or 503 response of a rejected request.
+        """
+        estimated_delay = self.estimate_queueing_delay()
+        if self.max_queueing_delay > 0 and estimated_delay > self.max_queueing_delay:
+            return None, self.rejection(503, 'rejected_queueing_delay', estimated_delay)
+        # A request that would still be queued at its deadline is rejected now instead of expiring with 504 later
+        if request_dict['deadline'] is not None and estimated_delay > request_dict['deadline'] - time.perf_counter():
+            return None, self.rejection(503, 'rejected_deadline', estimated_delay)
+        future = concurrent.futures.Future()
+        request_dict['future'] = future
+        try:
+            request_queue.put_nowait(('inference', request_dict))
+        except queue.Full:
+            return None, self.rejection(429, 'rejected_queue_full', estimated_delay)
+        self.count('admitted')
+        return future, None
+
+    def gauges(self):
+        """Return the queue gauges and the admission counters."""
+        with self.lock:
+            gauges = dict(self.counters)
+        gauges['queue_depth'] = request_queue.qsize()
+        gauges['max_queue_size'] = self.max_queue_size
+        gauges['estimated_queueing_delay'] = self.estimate_queueing_delay()
+        return gauges
+
 # Initialize Flask app instance
 app = Flask(__name__)
-# Single Queue and Condition for both services
-request_queue = queue.Queue()
-condition = threading.Condition()
-results = {}
+# Single bounded Queue for the inference service, each request carries the Future of its result
+request_queue = queue.Queue(maxsize=int(os.getenv('MAX_QUEUE_SIZE', '0')))
+admission = AdmissionController(max_queue_size=request_queue.maxsize, max_queueing_delay=float(os.getenv('ADMISSION_MAX_DELAY_MS', '0')) / 1000)
+# MyServer replicas of the default model, appended by the worker threads once they are ready
+replicas = []
 
-# Worker function to process requests
-def worker(logger):
+def create_server(logger, model_path=None):
     """
-    Worker thread to process inference and metric requests.
+    Create, initialize and warm up a MyServer for model_path (default MODEL_NAME), autotune its number of threads
+    and batch size if 'THREAD_AUTOTUNE' and 'BATCH_AUTOTUNE' are enabled, and run the steady-state warm-up
+    if 'WARM_UP_MAX_ITERATIONS' is set.
     """
-    def get_once_timings_and_num_threads_list(server):
+    server = my_server.MyServer(logger, model_path=model_path)
+    server.autotune_num_threads()
+    server.autotune_batch_size()
+    server.converge_warm_up()
+    return server
+
+def parse_model_paths(models):
+    """
+    Parse the 'MODELS' environment variable, 'name=path' pairs separated by commas, into a dictionary.
+    """
+    model_paths = {}
+    for entry in models.split(','):
+        if not entry.strip():
+            continue
+        name, separator, path = entry.partition('=')
+        assert separator and name.strip() and path.strip(), f"MODELS entries should be 'name=path', got '{entry}'"
+        model_paths[name.strip()] = path.strip()
+    return model_paths
+
+def model_size(path):
+    """
+    Estimate the memory of a model from the size of its file, or of all the files of its directory (e.g., SavedModel).
+    Returns 0 if the path does not exist, leaving the error to the AI framework loading the model.
+    """
+    if not os.path.exists(path):
+        return 0
+    if os.path.isdir(path):
+        return sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(path) for name in names)
+    return os.path.getsize(path)
+
+class ModelRegistry:
+    """
+    The models served by one replica: the default MyServer, always loaded, and one MyServer per model of 'MODELS'.
+    A listed model is loaded (init_kernel and warm_up) by its first request, and the least recently used
+    listed models are evicted when the estimated memory of the loaded models exceeds the memory budget.
+    """
+    def __init__(self, logger, default_server, model_paths, memory_budget):
+        self.logger = logger
+        self.default_server = default_server
+        self.model_paths = model_paths
+        self.memory_budget = memory_budget  # Bytes, 0 means unlimited
+        self.servers = OrderedDict()  # Model name -> (MyServer, size), least recently used first
+        self.used_memory = model_size(default_server.server_configs['MODEL_PATH'])
+        self.lock = threading.Lock()
+        self.pending_swaps = queue.Queue()  # (model name, new MyServer, size, swap start time), applied by the worker
+        self.counters = {
+            'loads': 0,
+            'evictions': 0,
+            'swaps': 0
+        }
+
+    def get(self, model_name):
+        """Return the MyServer of model_name (None for the default model), loading it if needed."""
+        if model_name is None:
+            return self.default_server
+        with self.lock:
+            if model_name in self.servers:
+                self.servers.move_to_end(model_name)
+                return self.servers[model_name][0]
+        return self.load(model_name)
+
+    def load(self, model_name):
+        """Evict the least recently used models to fit model_name in the memory budget, then load and warm it up."""
+        path = self.model_paths[model_name]
+        size = model_size(path)
+        with self.lock:
+            while self.memory_budget > 0 and self.servers and self.used_memory + size > self.memory_budget:
+                evicted_name, (_, evicted_size) = self.servers.popitem(last=False)
+                self.used_memory -= evicted_size
+                self.counters['evictions'] += 1
+                self.logger.info(f"Evicted model {evicted_name} ({evicted_size / 2**20:.1f} MB)")
+            assert self.memory_budget == 0 or self.used_memory + size <= self.memory_budget, \
+                f"Model {model_name} ({size / 2**20:.1f} MB) does not fit in MODEL_MEMORY_BUDGET_MB next to the default model"
+        server = create_server(self.logger, model_path=path)
+        server.aif_characteristics['network_name'] = model_name
+        server.model_generation = swap_generations.get(model_name, 0)
+        with self.lock:
+            self.servers[model_name] = (server, size)
+            self.used_memory += size
+            self.counters['loads'] += 1
+        self.logger.info(f"Loaded model {model_name} ({size / 2**20:.1f} MB) in {(server.once_timings['init'] + server.once_timings['warm_up']) * 1000:.2f} ms")
+        return server
+
+    def schedule_swap(self, model_name, server, swap_start):
+        """Hand a loaded and warmed up MyServer over to the worker, to replace the server of model_name."""
+        self.pending_swaps.put((model_name, server, model_size(server.server_configs['MODEL_PATH']), swap_start))
+
+    def apply_pending_swaps(self, drain=None):
         """
-        Retrieve the once_timings and NUM_THREADS from the server and return as a list.
+        Swap in the servers scheduled by schedule_swap. Called by the worker between two requests, so no request of
+        the replica is in flight, after drain() has waited for the requests still in the pipeline (if any).
         """
-        new_dict = server.once_timings.copy()
-        if 'NUM_THREADS' in server.server_configs:
-            new_dict['NUM_THREADS'] = server.server_configs['NUM_THREADS']
-        return [new_dict]
+        while not self.pending_swaps.empty():
+            model_name, server, size, swap_start = self.pending_swaps.get()
+            drain_start = time.perf_counter()
+            if drain is not None:
+                drain()
+            with self.lock:
+                if model_name is None:
+                    old_server = self.default_server
+                    old_size = model_size(old_server.server_configs['MODEL_PATH'])
+                    self.default_server = server
+                    replicas[replicas.index(old_server)] = server
+                elif model_name in self.servers:
+                    old_size = self.servers[model_name][1]
+                    self.servers[model_name] = (server, size)
+                else:
+                    # The model was evicted while the new one was loading, keep it as the most recently used one
+                    old_size = 0
+                    server.aif_characteristics['network_name'] = model_name
+                    self.servers[model_name] = (server, size)
+                self.used_memory += size - old_size
+                self.counters['swaps'] += 1
+            swap_end = time.perf_counter()
+            server.once_timings['swap_drain'] = swap_end - drain_start
+            server.once_timings['swap_total'] = swap_end - swap_start
+            self.logger.info(f"Swapped in {server.server_configs['MODEL_PATH']} after {server.once_timings['swap_total'] * 1000:.2f} ms "
+                             f"(drain {server.once_timings['swap_drain'] * 1000:.2f} ms)")
+            record_swap()
+
+    def stats(self):
+        """Return the loaded models, their estimated memory and the load/eviction/swap counters."""
+        with self.lock:
+            stats = dict(self.counters)
+            stats['loaded'] = list(self.servers)
+            stats['used_memory_mb'] = self.used_memory / 2**20
+        return stats
 
-    server = my_server.MyServer(logger)
+# Models served besides the default one, and the ModelRegistry of each replica
+model_paths = parse_model_paths(os.getenv('MODELS', ''))
+registries = []
+# Seconds an idle worker waits for a request before it checks again for pending model swaps
+SWAP_POLL_INTERVAL = 0.5
+
+def next_request(registry, drain=None):
+    """
+    Wait for the next item of the request queue, applying the pending model swaps of the replica before it.
+    """
+    while True:
+        registry.apply_pending_swaps(drain)
+        try:
+            return request_queue.get(timeout=SWAP_POLL_INTERVAL)
+        except queue.Empty:
+            continue
+
+# State of the hot model swap, one at a time
+swap_lock = threading.Lock()  # Held from the start of a swap until every replica has swapped
+swap_status_lock = threading.Lock()
+swap_status = {'state': 'idle'}
+# Completed swaps of each model (None for the default model), part of the payload keys of the result cache
+swap_generations = {}
+
+def record_swap():
+    """Count a replica that has swapped in its new server, and end the swap once all of them have."""
+    with swap_status_lock:
+        swap_status['replicas_swapped'] += 1
+        if swap_status['replicas_swapped'] == swap_status['replicas']:
+            # The cached responses of the old model are no longer looked up, every replica now serves the new one
+            swap_generations[swap_status['model']] = swap_generations.get(swap_status['model'], 0) + 1
+            swap_status['state'] = 'done'
+            swap_lock.release()
+
+def swap_model(logger, model_name, model_path):
+    """
+    Load and warm up one new MyServer per replica, with the old servers still serving, and schedule the swaps.
+    Runs on a background thread started by start_model_swap.
+    """
+    swap_start = time.perf_counter()
+    try:
+        new_servers = [create_server(logger, model_path=model_path) for _ in registries]
+        for server in new_servers:
+            server.once_timings['swap_load'] = server.once_timings['init']
+            server.once_timings['swap_warm_up'] = server.once_timings['warm_up']
+            server.model_generation = swap_generations.get(model_name, 0) + 1
+            if model_name is not None:
+                server.aif_characteristics['network_name'] = model_name
+        if model_name is not None:
+            model_paths[model_name] = model_path
+    except Exception as e:
+        logger.exception(f"Model swap failed: {e}")
+        with swap_status_lock:
+            swap_status.update({'state': 'failed', 'error': str(e)})
+        swap_lock.release()
+        return
+    with swap_status_lock:
+        swap_status.update({'state': 'swapping', 'replicas': len(new_servers), 'replicas_swapped': 0})
+    for registry, server in zip(registries, new_servers):
+        registry.schedule_swap(model_name, server, swap_start)
+
+def start_model_swap(json_input):
+    """
+    Validate a swap request of the admin service and start swap_model in the background.
+    json_input fields:
+    - model_path: Path of the new model artifact in the container.
+    - model (optional): Name of the listed model to swap, instead of the default model.
+    """
+    if not registries:
+        return Response(response=json.dumps({'status': 'starting'}), status=503, mimetype='application/json')
+    model_path = json_input.get('model_path')
+    model_name = json_input.get('model')
+    if not (isinstance(model_path, str) and os.path.exists(model_path)):
+        return Response(response=json.dumps({'model_path': 'invalid'}), status=400, mimetype='application/json')
+    if model_name is not None and model_name not in model_paths:
+        return Response(response=json.dumps({'error': f"Unknown model '{model_name}'"}), status=404, mimetype='application/json')
+    if not swap_lock.acquire(blocking=False):
+        with swap_status_lock:
+            return Response(response=json.dumps(swap_status), status=409, mimetype='application/json')
+    with swap_status_lock:
+        swap_status.clear()
+        swap_status.update({'state': 'loading', 'model': model_name, 'model_path': model_path})
+        response = Response(response=json.dumps(swap_status), status=202, mimetype='application/json')
+    threading.Thread(target=swap_model, args=(registries[0].logger, model_name, model_path), daemon=True).start()
+    return response
+
+def collect_batch(first_item, batch_size, max_batch_delay):
+    """
+    Collect up to batch_size inference items, starting from first_item, for the dynamic batcher.
+    Waits until the oldest item has spent max_batch_delay seconds in the queue.
+    Returns the list of batched items.
+    """
+    batch = [first_item]
+    close_time = first_item[1]['enqueue_time'] + max_batch_delay
+    while len(batch) < batch_size:
+        remaining = close_time - time.perf_counter()
+        if remaining <= 0:
+            break
+        try:
+            item = request_queue.get(timeout=remaining)
+        except queue.Empty:
+            break
+        batch.append(item)
+    return batch
+
+def create_request(data, deadline_header, model_name):
+    """
+    Build the request dictionary of an inference request, with its arrival time, optional deadline and model.
+    deadline_header: value of the X-Request-Deadline-Ms header, the time budget of the request in milliseconds, or None.
+    model_name: one of the models of 'MODELS' (from the URL or the X-Model-Name header), or None for the default model.
+    Returns (request_dict, None), or (None, response) with a 400 or 404 response if the request is invalid.
+    """
+    if model_name is not None and model_name not in model_paths:
+        return None, Response(response=json.dumps({'error': f"Unknown model '{model_name}'"}), status=404, mimetype='application/json')
+    enqueue_time = time.perf_counter()
+    request_dict = {'data': data, 'enqueue_time': enqueue_time, 'deadline': None, 'cache_key': None, 'model': model_name}
+    if deadline_header is not None:
+        try:
+            deadline_ms = float(deadline_header)
+        except ValueError:
+            deadline_ms = -1
+        if not deadline_ms > 0:
+            return None, Response(response=json.dumps({'error': "'X-Request-Deadline-Ms' should be a positive number of milliseconds"}),
+                                  status=400, mimetype='application/json')
+        request_dict['deadline'] = enqueue_time + deadline_ms / 1000
+    return request_dict, None
+
+def result_cache():
+    """Return the ResultCache shared by the server replicas, or None if it is disabled or no replica is ready yet."""
+    return replicas[0].result_cache if replicas else None
+
+def cached_response(request_dict):
+    """
+    Look up the payload of an inference request in the result cache.
+    Returns a response built from the cached result, or None on a miss (the cache key is kept in the request_dict,
+    so the worker can store the result).
+    The key includes the swap generation of the model, so a completed hot swap does not serve the old model's results.
+    """
+    cache = result_cache()
+    if cache is None:
+        return None
+    request_dict['cache_key'] = utils.content_key(('payload', request_dict['model'], swap_generations.get(request_dict['model'], 0)), request_dict['data'])
+    cached = cache.get(request_dict['cache_key'])
+    if cached is None:
+        return None
+    body, mimetype = cached
+    return Response(response=body, status=200, mimetype=mimetype)
+
+def complete_request(request_dict, result):
+    """
+    Complete the request's future with its response, waking only its own caller.
+    A successful response is also stored in the result cache, if the request was looked up there.
+    """
+    if request_dict['cache_key'] is not None and result.status_code == 200:
+        body = result.get_data()
+        result_cache().put(request_dict['cache_key'], (body, result.mimetype), len(body))
+    request_dict['future'].set_result(result)
+    startup_profiler.mark('time_to_first_response', first=True)
+
+def request_expired(request_dict):
+    """Return whether the deadline of a queued request has already passed."""
+    return request_dict['deadline'] is not None and time.perf_counter() > request_dict['deadline']
+
+def expire_request(logger, request_dict):
+    """
+    Answer a request whose deadline has passed with 504, without processing it further, and count the expiration.
+    """
+    logger.info('Request expired %.2f ms after its deadline', (time.perf_counter() - request_dict['deadline']) * 1000)
+    admission.count('expired')
+    request_dict['future'].set_result(Response(response=json.dumps({'status': HTTPStatus.GATEWAY_TIMEOUT.phrase}),
+                                               status=504, mimetype='application/json'))
+
+def fail_request(logger, server, request_dict, exception):
+    """
+    Log the exception raised while processing a request and pass it to the request's future,
+    so the caller gets an error response and the worker keeps serving.
+    A DeadlineExceeded exception instead expires the request.
+    The per-request resources of the server, if it was selected, are released in both cases.
+    """
+    if server is not None:
+        server.cleanup_request()
+    if isinstance(exception, base_server.DeadlineExceeded):
+        expire_request(logger, request_dict)
+        return
+    logger.exception(f"Request failed: {exception}")
+    # Release the locals of the failed request kept by the traceback (e.g., its experiment output, which may be a view
+    # of the output tensor of a TFLite interpreter), so the worker can run its next request meanwhile
+    traceback.clear_frames(exception.__traceback__)
+    request_dict['future'].set_exception(exception)
+
+def pipelined_worker(logger, registry, pipeline_queue_size):
+    """
+    Process the inference requests of one replica in a three-stage pipeline.
+    The calling thread runs inference_preprocess, and two more threads run inference_execute and inference_postprocess,
+    connected by queues of pipeline_queue_size requests, which bound the requests in flight and apply backpressure.
+    Each request carries the MyServer of its model through the stages.
+    """
+    execute_queue = queue.Queue(maxsize=pipeline_queue_size)
+    postprocess_queue = queue.Queue(maxsize=pipeline_queue_size)
+
+    def execute_stage():
+        while True:
+            request_dict, server, request_state = execute_queue.get()
+            try:
+                server.inference_execute(request_state=request_state)
+            except Exception as e:
+                fail_request(logger, server, request_dict, e)
+                execute_queue.task_done()
+                continue
+            # Handed over to the postprocess stage before it is marked done, so drain() never misses it between the stages
+            postprocess_queue.put((request_dict, server, request_state))
+            execute_queue.task_done()
+
+    def postprocess_stage():
+        while True:
+            request_dict, server, request_state = postprocess_queue.get()
+            try:
+                encoded_output = server.inference_postprocess(request_state=request_state)
+                result = server.send_response(encoded_output=encoded_output)
+            except Exception as e:
+                fail_request(logger, server, request_dict, e)
+                continue
+            finally:
+                postprocess_queue.task_done()
+            complete_request(request_dict, result)
+            # In a pipeline a new request starts every slowest-stage time, not every full_inference
+            timings = request_state['timings']
+            admission.record_service_time(max(timings['decode_input'] + timings['create_and_preprocess'] + timings['reshape_input'],
+                                              timings['experiment'],
+                                              timings['reshape_output'] + timings['postprocess'] + timings['encode_output']))
+
+    def drain():
+        # Wait until the requests in flight have left the execute and postprocess stages
+        execute_queue.join()
+        postprocess_queue.join()
+
+    threading.Thread(target=execute_stage, daemon=True).start()
+    threading.Thread(target=postprocess_stage, daemon=True).start()
     while True:
         # Wait for a request to be enqueued
-        item = request_queue.get()
-        service_identifier, request_id, request_dict = item
-        if service_identifier == 'inference':
-            encoded_output = server.inference(indata=request_dict['data'])
-            result = server.send_response(encoded_output=encoded_output) 
-        elif service_identifier == 'metric':
-            once_timings_and_num_threads_list = get_once_timings_and_num_threads_list(server)
-            json_input = request_dict['json']
-            if utils.strtobool(json_input['all']):
-                result = Response(response=json.dumps(server.my_metrics_list + once_timings_and_num_threads_list), status=200, mimetype='application/json')
-            else:
-                number = json_input['number']
-                if isinstance(number, int) and number > 0:
-                    result = Response(response=json.dumps(server.my_metrics_list[-number:] + once_timings_and_num_threads_list), status=200, mimetype='application/json')
-                else:
-                    result = Response(response={'number': 'invalid'}, status=400, mimetype='application/json')
-        # Store the result and notify
-        with condition:
-            results[request_id] = result
-            condition.notify_all()
+        _, request_dict = next_request(registry, drain=drain)
+        server = None
+        try:
+            server = registry.get(request_dict['model'])
+            request_state = server.inference_preprocess(indata=request_dict['data'], deadline=request_dict['deadline'])
+        except Exception as e:
+            fail_request(logger, server, request_dict, e)
+            continue
+        execute_queue.put((request_dict, server, request_state))
+
+# Worker function to process requests
+def worker(logger, replica_id, pipelined_inference, pipeline_queue_size):
+    """
+    Worker thread to process inference requests.
+    Each worker creates and owns one MyServer replica (and the ModelRegistry of the models of 'MODELS')
+    and competes with the other workers for the queued requests.
+    """
+    server = create_server(logger)
+    registry = ModelRegistry(logger, default_server=server, model_paths=model_paths,
+                             memory_budget=int(float(os.getenv('MODEL_MEMORY_BUDGET_MB', '0')) * 2**20))
+    registries.append(registry)
+    replicas.append(server)
+    startup_profiler.mark('time_to_ready')
+    logger.info(f"Replica {replica_id} ready, {startup_profiler.timings()['time_to_ready'] * 1000:.2f} ms after the start of the process")
+    dynamic_batching = server.server_configs['DYNAMIC_BATCHING'] and server.server_configs['SERVER_MODE'] == 0
+    if pipelined_inference:
+        pipelined_worker(logger, registry, pipeline_queue_size)
+    while True:
+        # Wait for a request to be enqueued
+        item = next_request(registry)
+        request_dict = item[1]
+        if dynamic_batching:
+            # The batching configuration of the replica's default model, read again after every swap
+            default_configs = registry.default_server.server_configs
+            batch = collect_batch(first_item=item, batch_size=default_configs['BATCH_SIZE'], max_batch_delay=default_configs['MAX_BATCH_DELAY'])
+            # Drop the requests that expired while waiting, so they do not take a slot of the batch
+            for batch_item in batch:
+                if request_expired(batch_item[1]):
+                    expire_request(logger, batch_item[1])
+            # Requests for different models are executed as separate batches
+            model_batches = OrderedDict()
+            for batch_item in batch:
+                if not batch_item[1]['future'].done():
+                    model_batches.setdefault(batch_item[1]['model'], []).append(batch_item)
+            for model_name, model_batch in model_batches.items():
+                try:
+                    model_server = registry.get(model_name)
+                except Exception as e:
+                    for batch_item in model_batch:
+                        fail_request(logger, None, batch_item[1], e)
+                    continue
+                # Split into batches of the model's own BATCH_SIZE, which may differ from the default model's
+                model_batch_size = model_server.server_configs['BATCH_SIZE']
+                for chunk_start in range(0, len(model_batch), model_batch_size):
+                    chunk = model_batch[chunk_start:chunk_start + model_batch_size]
+                    try:
+                        encoded_outputs = model_server.inference_batch(indata_list=[batch_item[1]['data'] for batch_item in chunk])
+                        results = [model_server.send_response(encoded_output=encoded_output) for encoded_output in encoded_outputs]
+                    except Exception as e:
+                        for batch_item in chunk:
+                            fail_request(logger, model_server, batch_item[1], e)
+                        continue
+                    for batch_item, result in zip(chunk, results):
+                        complete_request(batch_item[1], result)
+                    admission.record_service_time(model_server.inference_timings['full_inference'] / len(chunk))
+            continue
+        server = None
+        try:
+            server = registry.get(request_dict['model'])
+            encoded_output = server.inference(indata=request_dict['data'], deadline=request_dict['deadline'])
+            result = server.send_response(encoded_output=encoded_output)
+        except Exception as e:
+            fail_request(logger, server, request_dict, e)
+            continue
+        complete_request(request_dict, result)
+        admission.record_service_time(server.inference_timings['full_inference'])
+
+def get_metrics(json_input):
+    """
+    Build the response of the metric service from a snapshot of the shared metrics list, off the inference path.
+    json_input fields:
+    - all: 'True' to return all the metrics, otherwise the 'number' most recent ones.
+    - number: Positive integer, used when all is not 'True'.
+    - since (optional): Cursor returned by a previous call, to only return the metrics recorded after it.
+      When since is given, all defaults to 'True'.
+    - start_time, end_time (optional): Wall-clock range (seconds since the epoch) of the returned metrics.
+      When a range is given, all defaults to 'True' too.
+    The last element of the response holds the once_timings (and NUM_THREADS) of the first replica, the startup phases
+    of the process (utils.StartupProfiler), the next cursor,
+    the admission gauges and, if enabled, the result cache counters, the metrics exporter counters and the model registry
+    of the first replica.
+    """
+    if not replicas:
+        return Response(response=json.dumps({'status': 'starting'}), status=503, mimetype='application/json')
+    server = replicas[0]
+    since = json_input.get('since')
+    if since is not None and not (isinstance(since, int) and since >= 0):
+        return Response(response=json.dumps({'since': 'invalid'}), status=400, mimetype='application/json')
+    time_range = {}
+    for field in ['start_time', 'end_time']:
+        value = json_input.get(field)
+        if value is not None:
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                return Response(response=json.dumps({field: 'invalid'}), status=400, mimetype='application/json')
+            time_range[field] = value
+    number = None
+    if not utils.strtobool(json_input.get('all', 'True' if since is not None or time_range else 'False')):
+        number = json_input.get('number')
+        if not (isinstance(number, int) and number > 0):
+            return Response(response=json.dumps({'number': 'invalid'}), status=400, mimetype='application/json')
+    metrics, cursor = server.my_metrics_list.snapshot(number=number, since=since, **time_range)
+
+    # Retrieve the once_timings, NUM_THREADS and the metrics cursor
+    new_dict = server.once_timings.copy()
+    new_dict.update(startup_profiler.timings())
+    if 'NUM_THREADS' in server.server_configs:
+        new_dict['NUM_THREADS'] = server.server_configs['NUM_THREADS']
+    if server.server_configs.get('NUM_INTERPRETERS', 1) > 1:
+        new_dict['NUM_INTERPRETERS'] = server.server_configs['NUM_INTERPRETERS']
+    if len(replicas) > 1:
+        new_dict['NUM_REPLICAS'] = len(replicas)
+    new_dict['metrics_cursor'] = cursor
+    new_dict['admission'] = admission.gauges()
+    if replicas[0].result_cache is not None:
+        new_dict['result_cache'] = replicas[0].result_cache.stats()
+    if replicas[0].metrics_exporters:
+        new_dict['metrics_exporters'] = {exporter.name: exporter.stats() for exporter in replicas[0].metrics_exporters}
+    if model_paths:
+        new_dict['models'] = registries[0].stats()
+    with swap_status_lock:
+        if swap_status['state'] != 'idle':
+            new_dict['model_swap'] = dict(swap_status)
+    return Response(response=json.dumps(metrics + [new_dict]), status=200, mimetype='application/json')
+
+def get_aggregates(json_input):
+    """
+    Build the response of the aggregate metrics service from the shared metrics store, off the inference path.
+    json_input fields (optional, all the stored metrics by default):
+    - window: Only aggregate the metrics of the last window seconds (wall-clock).
+    - number: Only aggregate the number most recent metrics.
+    Returns the count, and the mean, p50, p95 and p99 of the processing, data preparation and execution latency
+    and of the throughput.
+    """
+    if not replicas:
+        return Response(response=json.dumps({'status': 'starting'}), status=503, mimetype='application/json')
+    window = json_input.get('window')
+    if window is not None and (isinstance(window, bool) or not isinstance(window, (int, float)) or window <= 0):
+        return Response(response=json.dumps({'window': 'invalid'}), status=400, mimetype='application/json')
+    number = json_input.get('number')
+    if number is not None and not (isinstance(number, int) and number > 0):
+        return Response(response=json.dumps({'number': 'invalid'}), status=400, mimetype='application/json')
+    aggregates = replicas[0].my_metrics_list.aggregate(number=number, start_time=None if window is None else time.time() - window)
+    return Response(response=json.dumps(aggregates), status=200, mimetype='application/json')
 
 @app.route('/api/infer', methods=['POST'])
-def inference_service():
+@app.route('/api/infer/<model_name>', methods=['POST'])
+def inference_service(model_name=None):
     """
     Service for performing inference on data received in POST requests.
-    Enqueue the request data and return a response immediately.
-    """
-    request_id = str(uuid.uuid4())
-    request_dict = {'data': request.data}
-    # Enqueue the request for processing
-    with condition:
-        request_queue.put(('inference', request_id, request_dict))
-        condition.wait_for(lambda: request_id in results)
-    # Get the result and return
-    result = results.pop(request_id)
-    return result
+    Enqueue the request data, if admitted, and return the result once the worker completes it.
+    The model is selected by the URL or the X-Model-Name header, and defaults to MODEL_NAME.
+    """
+    request_dict, rejection = create_request(data=request.data, deadline_header=request.headers.get('X-Request-Deadline-Ms'),
+                                             model_name=model_name or request.headers.get('X-Model-Name'))
+    if rejection is not None:
+        return rejection
+    cached = cached_response(request_dict)
+    if cached is not None:
+        return cached
+    future, rejection = admission.submit(request_dict)
+    if rejection is not None:
+        return rejection
+    return future.result()
+
+@app.route('/api/admin/swap', methods=['POST'])
+def swap_service():
+    """
+    Service for swapping in a new model artifact without restarting the container.
+    Returns 202 once the swap has started; its progress is reported under 'model_swap' by the metric service.
+    """
+    return start_model_swap(request.get_json())
+
+def get_prometheus_metrics():
+    """
+    Build the response of the Prometheus scrape endpoint from the 'prometheus' metrics exporter, in the text exposition format.
+    """
+    if not replicas:
+        return Response(response=json.dumps({'status': 'starting'}), status=503, mimetype='application/json')
+    for exporter in replicas[0].metrics_exporters:
+        if exporter.name == 'prometheus':
+            return Response(response=exporter.render(), status=200, content_type='text/plain; version=0.0.4; charset=utf-8')
+    return Response(status=404)
+
+def get_stats():
+    """
+    Build the response of the stats service from the stage histograms shared by the server replicas.
+    """
+    if not replicas:
+        return Response(response=json.dumps({'status': 'starting'}), status=503, mimetype='application/json')
+    return Response(response=json.dumps(replicas[0].stage_histograms.summary()), status=200, mimetype='application/json')
+
+@app.route('/api/stats', methods=['GET'])
+def stats_service():
+    """
+    Service for fetching the latency percentiles of the inference stages.
+    """
+    return get_stats()
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_service():
+    """
+    Service for Prometheus scrapes, if 'prometheus' is in METRICS_EXPORTERS.
+    """
+    return get_prometheus_metrics()
 
 @app.route('/api/metrics', methods=['POST'])
 def metric_service():
     """
     Service for fetching metrics based on the parameters received in the POST request.
-    Enqueue the request data and return a response immediately.
-    """
-    json_input = request.get_json()
-    request_id = str(uuid.uuid4())
-    request_dict = {'json': json_input}
-    # Enqueue the request for processing
-    with condition:
-        request_queue.put(('metric', request_id, request_dict))
-        condition.wait_for(lambda: request_id in results)
-    # Get the result and return
-    result = results.pop(request_id)
-    return result
+    Served directly from a snapshot of the metrics list, without waiting for the inference queue.
+    """
+    return get_metrics(request.get_json())
+
+@app.route('/api/metrics/aggregate', methods=['POST'])
+def aggregate_service():
+    """
+    Service for fetching the rolling-window aggregates of the metrics, instead of the raw metrics.
+    """
+    return get_aggregates(request.get_json())
+
+async def read_http_request(reader, keep_alive_timeout):
+    """
+    Read one HTTP/1.1 request from the connection for the asyncio serving mode.
+    Returns (method, path, version, headers, body), with lower-case header names, or None if the connection
+    was closed, stayed idle for keep_alive_timeout seconds, or sent a request that cannot be parsed.
+    Only bodies with a Content-Length are supported.
+    """
+    try:
+        head = await asyncio.wait_for(reader.readuntil(b'\r\n\r\n'), timeout=keep_alive_timeout)
+        request_line, *header_lines = head.decode('latin-1').rstrip('\r\n').split('\r\n')
+        method, path, version = request_line.split(' ')
+        headers = {}
+        for line in header_lines:
+            key, _, value = line.partition(':')
+            headers[key.strip().lower()] = value.strip()
+        if 'chunked' in headers.get('transfer-encoding', '').lower():
+            return None
+        body = await reader.readexactly(int(headers.get('content-length', '0')))
+    except (asyncio.TimeoutError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError, ValueError):
+        return None
+    return method, path, version, headers, body
+
+async def dispatch_http_request(method, path, headers, body):
+    """
+    Route a request of the asyncio serving mode to the same services as the Flask app, and await the result.
+    Returns a flask.Response.
+    """
+    path = path.split('?', 1)[0]
+    model_name = headers.get('x-model-name')
+    if path.startswith('/api/infer/'):
+        path, model_name = '/api/infer', path[len('/api/infer/'):]
+    if path not in ('/api/infer', '/api/metrics', '/api/metrics/aggregate', '/api/admin/swap', '/api/stats', '/metrics'):
+        return Response(status=404)
+    if path in ('/api/stats', '/metrics'):
+        if method != 'GET':
+            return Response(status=405)
+        return await asyncio.get_running_loop().run_in_executor(None, get_stats if path == '/api/stats' else get_prometheus_metrics)
+    if method != 'POST':
+        return Response(status=405)
+    if path in ('/api/metrics', '/api/metrics/aggregate', '/api/admin/swap'):
+        try:
+            json_input = json.loads(body)
+        except ValueError:
+            return Response(status=400)
+        if not isinstance(json_input, dict):
+            return Response(response=json.dumps({'error': 'The JSON body should be an object'}), status=400, mimetype='application/json')
+        # Serialization of the snapshot runs off the event loop
+        service = {'/api/metrics': get_metrics, '/api/metrics/aggregate': get_aggregates, '/api/admin/swap': start_model_swap}[path]
+        return await asyncio.get_running_loop().run_in_executor(None, service, json_input)
+    request_dict, rejection = create_request(data=body, deadline_header=headers.get('x-request-deadline-ms'), model_name=model_name)
+    if rejection is not None:
+        return rejection
+    cached = cached_response(request_dict)
+    if cached is not None:
+        return cached
+    future, rejection = admission.submit(request_dict)
+    if rejection is not None:
+        return rejection
+    try:
+        return await asyncio.wrap_future(future)
+    except Exception:
+        return Response(status=500)
+
+async def write_http_response(writer, response, keep_alive):
+    """
+    Serialize a flask.Response as an HTTP/1.1 response on the connection of the asyncio serving mode.
+    """
+    body = response.get_data()
+    status = HTTPStatus(response.status_code)
+    head_lines = [f"HTTP/1.1 {status.value} {status.phrase}"]
+    for key, value in response.headers.items():
+        if key.lower() not in ('content-length', 'connection'):
+            head_lines.append(f"{key}: {value}")
+    head_lines.append(f"Content-Length: {len(body)}")
+    head_lines.append(f"Connection: {'keep-alive' if keep_alive else 'close'}")
+    writer.write(('\r\n'.join(head_lines) + '\r\n\r\n').encode('latin-1') + body)
+    await writer.drain()
+
+async def handle_connection(reader, writer, keep_alive_timeout):
+    """
+    Serve the requests of one client connection in the asyncio serving mode.
+    The connection is kept alive between requests, unless the client asks to close it or stays idle.
+    """
+    try:
+        while True:
+            http_request = await read_http_request(reader, keep_alive_timeout)
+            if http_request is None:
+                break
+            method, path, version, headers, body = http_request
+            connection = headers.get('connection', '').lower()
+            keep_alive = connection != 'close' if version == 'HTTP/1.1' else connection == 'keep-alive'
+            try:
+                response = await dispatch_http_request(method, path, headers, body)
+            except Exception as e:
+                # Answer the failed request like Flask does, and keep the connection for the next ones
+                logging.getLogger('sampleLogger').exception(f"Request {method} {path} failed: {e}")
+                response = Response(response=json.dumps({'status': HTTPStatus.INTERNAL_SERVER_ERROR.phrase}),
+                                    status=500, mimetype='application/json')
+            await write_http_response(writer, response, keep_alive)
+            if not keep_alive:
+                break
+    except ConnectionError:
+        pass
+    finally:
+        writer.close()
+
+def serve_asyncio(host, port):
+    """
+    Run the asyncio serving mode on the specified host and port until the process is stopped.
+    'KEEP_ALIVE_TIMEOUT' sets the seconds an idle connection is kept open (default 75).
+    """
+    keep_alive_timeout = float(os.getenv('KEEP_ALIVE_TIMEOUT', '75'))
+
+    async def serve():
+        server = await asyncio.start_server(functools.partial(handle_connection, keep_alive_timeout=keep_alive_timeout),
+                                            host=host, port=port, limit=1024 * 1024)
+        async with server:
+            await server.serve_forever()
+
+    asyncio.run(serve())
 
 def main():
     """
-    Main function to configure logging, start the worker thread, and run the Flask app.
+    Main function to configure logging, start the worker threads, and run the Flask app or the asyncio server.
     """
     # Configure logging based on the environmental variable 'LOG_CONFIG'
     logging.config.fileConfig(os.environ['LOG_CONFIG'], disable_existing_loggers=False)
@@ -143,13 +1010,37 @@ def main():
     # Create logger instances for both logging to file and console
     logger = logging.getLogger('sampleLogger')  # Logger for logging to file
     root_logger = logging.getLogger()  # Logger for logging to console
+    if utils.strtobool(os.getenv('ASYNC_LOGGING', 'False')):
+        # Move the file and console I/O off the request threads, flushing the queued records at exit
+        for listener in utils.enable_async_logging(['sampleLogger', '']):
+            atexit.register(listener.stop)
 
-    # Start the worker thread
-    worker_thread = threading.Thread(target=worker, args=(logger,), daemon=True)
-    worker_thread.start()
+    # Start one worker thread per server replica
+    num_replicas = int(os.getenv('NUM_REPLICAS', '1'))
+    assert num_replicas > 0, f"NUM_REPLICAS should be a positive integer, got {num_replicas}"
+    pipelined_inference = utils.strtobool(os.getenv('PIPELINED_INFERENCE', 'False'))
+    pipeline_queue_size = int(os.getenv('PIPELINE_QUEUE_SIZE', '2'))
+    # Validated before any worker starts, so an invalid combination stops the process instead of its workers
+    if pipelined_inference and utils.strtobool(os.getenv('DYNAMIC_BATCHING', 'False')) \
+            and utils.decode_server_mode(os.environ['SERVER_MODE']) == 0:
+        raise AssertionError('PIPELINED_INFERENCE cannot be combined with DYNAMIC_BATCHING in Latency Server Mode')
+    # Thread autotuning needs a {Pair}Server that overrides resize_threads (CpuServer, ArmServer) or autotune_num_threads (CpuTfServer)
+    if utils.strtobool(os.getenv('THREAD_AUTOTUNE', 'False')) \
+            and my_server.MyServer.resize_threads is base_server.BaseServer.resize_threads \
+            and my_server.MyServer.autotune_num_threads is base_server.BaseServer.autotune_num_threads:
+        raise AssertionError('THREAD_AUTOTUNE is not supported by this {Pair}Server')
+    for replica_id in range(num_replicas):
+        worker_thread = threading.Thread(target=worker, args=(logger, replica_id, pipelined_inference, pipeline_queue_size), daemon=True)
+        worker_thread.start()
 
-    # Run the Flask app with specified host and port
-    app.run(host=os.environ['SERVER_IP'], port=int(os.environ['SERVER_PORT']))
+    # Run the selected serving mode with specified host and port
+    serving_mode = os.getenv('SERVING_MODE', 'flask').lower()
+    if serving_mode == 'flask':
+        app.run(host=os.environ['SERVER_IP'], port=int(os.environ['SERVER_PORT']))
+    elif serving_mode == 'asyncio':
+        serve_asyncio(host=os.environ['SERVER_IP'], port=int(os.environ['SERVER_PORT']))
+    else:
+        raise AssertionError(f"SERVING_MODE is neither flask nor asyncio, got {serving_mode}")
 
 if __name__ == '__main__':
     main()
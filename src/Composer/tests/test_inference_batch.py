@@ -0,0 +1,73 @@
+"""
+Tests that BaseServer.inference_batch keeps a separate request_state for every request merged by the dynamic batcher.
+"""
+
+import os
+import sys
+import logging
+import tempfile
+import unittest
+from unittest import mock
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import base_server
+
+class StatefulServer(base_server.BaseServer):
+    """
+    Latency Server Mode server whose experiment steps keep per-request state, like CLASSIFICATION_THR: decode_input
+    stores the request's name in request_state, and encode_output returns the name next to the output.
+    """
+    def __init__(self, logger):
+        super().__init__(logger)
+        self.experiment_configs = {}
+        self.cleaned_up = []
+
+    def decode_input(self, indata):
+        name, value = indata.split(b':')
+        self.request_state['name'] = name.decode()
+        return np.array([[float(value)]], dtype=np.float32), 1
+
+    def create_and_preprocess(self, decoded_input, run_total):
+        self.request_state['preprocessed'] = float(decoded_input[0, 0])
+        return decoded_input
+
+    def experiment_single(self, input, run_total=1):
+        return input * 2
+
+    def postprocess(self, exp_output, run_total):
+        assert float(exp_output[0, 0]) == 2 * self.request_state['preprocessed']
+        return float(exp_output[0, 0])
+
+    def encode_output(self, output):
+        if output < 0:
+            raise ValueError('negative output')
+        return {'name': self.request_state['name'], 'output': output}
+
+    def cleanup_request(self):
+        self.cleaned_up.append(self.request_state.get('name'))
+
+class InferenceBatchStateTest(unittest.TestCase):
+    def setUp(self):
+        env_file = tempfile.NamedTemporaryFile(suffix='.env', delete=False)
+        env_file.close()
+        self.addCleanup(os.remove, env_file.name)
+        environment = {
+            'MODEL_NAME': 'model', 'BATCH_SIZE': '4', 'SERVER_MODE': 'LAT', 'DYNAMIC_BATCHING': 'True',
+            'SEND_METRICS': 'False', 'METRICS_LIST_SIZE': '100', 'ENV_FILE': env_file.name, 'APP_NAME': 'app',
+            'NETWORK_NAME': 'model', 'NETWORK_TYPE': 'test', 'AI_DEVICE': 'CPU', 'FOCUS': 'test'
+        }
+        with mock.patch.dict(os.environ, environment):
+            self.server = StatefulServer(logging.getLogger('test'))
+
+    def test_merged_requests_keep_their_own_state(self):
+        encoded_outputs = self.server.inference_batch(indata_list=[b'first:1', b'second:3'])
+        self.assertEqual(encoded_outputs, [{'name': 'first', 'output': 2.0}, {'name': 'second', 'output': 6.0}])
+
+    def test_failed_batch_cleans_up_every_request(self):
+        with self.assertRaises(ValueError):
+            self.server.inference_batch(indata_list=[b'first:1', b'second:-3'])
+        self.assertEqual(self.server.cleaned_up, ['first', 'second'])
+
+if __name__ == '__main__':
+    unittest.main()
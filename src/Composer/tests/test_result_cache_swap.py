@@ -0,0 +1,104 @@
+"""
+Tests that the payload result cache of flask_server.py does not serve the responses of a model replaced by a hot swap.
+flask_server.py is driven through the Flask test client, with one worker thread and a MyServer whose output is the
+payload scaled by the factor written in its model file.
+"""
+
+import os
+import sys
+import json
+import time
+import types
+import tempfile
+import threading
+import logging
+import unittest
+import numpy as np
+from flask import Response
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import base_server
+
+class ScalingServer(base_server.BaseServer):
+    """Latency Server Mode MyServer that multiplies the float32 payload by the factor of its model file."""
+    def __init__(self, logger, model_path=None):
+        super().__init__(logger, model_path=model_path)
+        self.experiment_configs = {}
+        with open(self.server_configs['MODEL_PATH']) as model_file:
+            self.factor = float(model_file.read())
+        self.once_timings['init'] = 0.0
+        self.once_timings['warm_up'] = 0.0
+
+    def decode_input(self, indata):
+        return np.frombuffer(indata, dtype=np.float32)[np.newaxis, :], 1
+
+    def create_and_preprocess(self, decoded_input, run_total):
+        return decoded_input
+
+    def experiment_single(self, input, run_total=1):
+        return input * self.factor
+
+    def postprocess(self, exp_output, run_total):
+        return exp_output.tolist()
+
+    def encode_output(self, output):
+        return output
+
+    def send_response(self, encoded_output):
+        return Response(response=json.dumps(encoded_output), status=200, mimetype='application/json')
+
+class ResultCacheSwapTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.model_dir = tempfile.TemporaryDirectory()
+        cls.model_paths = {}
+        for name, factor in [('m1', '1'), ('m2', '10')]:
+            cls.model_paths[name] = os.path.join(cls.model_dir.name, name)
+            with open(cls.model_paths[name], 'w') as model_file:
+                model_file.write(factor)
+        env_file = os.path.join(cls.model_dir.name, '.env')
+        open(env_file, 'w').close()
+        os.environ.update({
+            'MODEL_NAME': cls.model_paths['m1'], 'BATCH_SIZE': '1', 'SERVER_MODE': 'LAT', 'SEND_METRICS': 'False',
+            'METRICS_LIST_SIZE': '100', 'RESULT_CACHE': 'True', 'ENV_FILE': env_file, 'APP_NAME': 'app',
+            'NETWORK_NAME': 'm1', 'NETWORK_TYPE': 'test', 'AI_DEVICE': 'CPU', 'FOCUS': 'test'
+        })
+        my_server = types.ModuleType('my_server')
+        my_server.MyServer = ScalingServer
+        sys.modules['my_server'] = my_server
+        import flask_server
+        cls.flask_server = flask_server
+        logger = logging.getLogger('test')
+        threading.Thread(target=flask_server.worker, args=(logger, 0, False, 2), daemon=True).start()
+        deadline = time.time() + 10
+        while not flask_server.replicas and time.time() < deadline:
+            time.sleep(0.01)
+        cls.client = flask_server.app.test_client()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.model_dir.cleanup()
+
+    def infer(self, values):
+        response = self.client.post('/api/infer', data=np.array(values, dtype=np.float32).tobytes())
+        self.assertEqual(response.status_code, 200)
+        return response.get_json()
+
+    def test_swap_invalidates_cached_payloads(self):
+        self.assertEqual(self.infer([1, 2, 3]), [[1.0, 2.0, 3.0]])
+        self.assertEqual(self.infer([1, 2, 3]), [[1.0, 2.0, 3.0]])
+        self.assertGreaterEqual(self.flask_server.result_cache().stats()['hits'], 1)
+
+        response = self.client.post('/api/admin/swap', json={'model_path': self.model_paths['m2']})
+        self.assertEqual(response.status_code, 202)
+        deadline = time.time() + 10
+        while self.flask_server.swap_status['state'] != 'done' and time.time() < deadline:
+            time.sleep(0.05)
+        self.assertEqual(self.flask_server.swap_status['state'], 'done')
+        self.assertEqual(self.flask_server.replicas[0].model_generation, 1)
+
+        self.assertEqual(self.infer([1, 2, 3]), [[10.0, 20.0, 30.0]])
+        self.assertEqual(self.infer([4, 5, 6]), [[40.0, 50.0, 60.0]])
+
+if __name__ == '__main__':
+    unittest.main()
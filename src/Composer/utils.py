@@ -6,31 +6,540 @@ This module provides various utility functions used for RedisTimeSeries monitori
 within the AI@EDGE project.
 
 Overview:
-- The LimitedList class: A fixed-size First In First Out (FIFO) list for storing metrics.
+- The MetricsRing class: A fixed-size First In First Out (FIFO) columnar store of metrics, with O(1) appends and
+  rolling-window aggregates.
+- The SQLiteMetricsList class: A persistent, disk-bounded alternative to MetricsRing, backed by an SQLite table in WAL mode,
+  so the metrics survive container restarts.
+- The shared_metrics_list function: The process-wide metrics store (MetricsRing or SQLiteMetricsList) shared by all the server replicas.
+- The ResultCache class and the shared_result_cache function: A content-addressed LRU/TTL cache of inference results.
+- The LatencyHistogram and StageHistograms classes, and the shared_stage_histograms function: Constant-memory
+  latency histograms of the inference stages, used in the stats service.
+- The shared_autotune function: The batch size and thread autotuning results of each model, shared by the server replicas.
+- The available_cpus function: The CPUs available to the process, within the cgroup CPU quota of the container.
+- The enable_async_logging function: Moves the log handlers (file and console I/O) off the request threads.
+- The StartupProfiler class and the shared_startup_profiler function: The startup phases of the process, timed from
+  the start of the process, for the cold-start time.
 - Metric dictionary structure: Defines the relevant fields used in the metrics service.
 - Functions for environment variable management, Redis connection, metric data preparation, and sending metrics to Redis.
+- The metrics exporters, shared by all the server replicas (shared_metrics_exporters), selected with METRICS_EXPORTERS:
+  - RedisMetricsExporter: Sends the metrics to RedisTimeSeries, directly or through a RedisExporter (a background thread,
+    in coalesced and pipelined flushes), optionally pre-aggregated in wall-clock windows by a WindowedAggregator.
+  - FileMetricsExporter: Appends the metrics to a size-rotated JSON Lines or CSV file, with buffered gathered writes.
+  - PrometheusMetricsExporter: Counters, latency histograms and gauges, in the Prometheus text format.
 """
 
 from dotenv import load_dotenv
 from pathlib import Path
-from redistimeseries.client import Client
 import os
+import io
+import csv
 import time
+import json
+import atexit
+import bisect
+import sqlite3
+import threading
+import hashlib
+import math
+import numpy as np
+import queue
+import logging
+import logging.handlers
+from collections import OrderedDict
 
-class LimitedList(list):
+# Fields of the metric dictionaries (create_metric_dictionary): the constants of the AIF instance, interned once per
+# distinct combination, and the per-request numeric fields, stored in NumPy columns
+METRIC_LABEL_FIELDS = ['app_name', 'network_name', 'network_type', 'device', 'focus', 'AIF_timestamp', 'app_UID', 'instance_UID', 'node_name']
+METRIC_NUMERIC_FIELDS = {
+    'processing_latency': np.float64,
+    'data_preparation_latency': np.float64,
+    'execution_latency': np.float64,
+    'throughput': np.float64,
+    'dataset_size': np.int64,
+    'batch_size': np.int64,
+    'timestamp': np.int64,
+    'wall_timestamp': np.float64
+}
+AGGREGATE_FIELDS = ['processing_latency', 'data_preparation_latency', 'execution_latency', 'throughput']
+
+class MetricsRing:
     """
-    Extends the list class to create a fixed-size First In First Out (FIFO) list.
-    Items appended beyond the max size automatically push out the oldest items.
+    Fixed-size First In First Out (FIFO) store of metric dictionaries, as a columnar ring buffer.
+    The numeric fields are stored in preallocated NumPy columns and the constant fields as an index into the interned
+    label tuples, so an append is O(1) and allocates nothing, and the oldest items are overwritten beyond the max size.
+    Appends are serialized with a lock, so the store can be shared by the worker threads of the server replicas.
+    Every appended item gets a sequence number, the cursor of the snapshot method.
     Used in the metrics service.
     """
     def __init__(self, max_size):
         self.max_size = max_size
-        super().__init__()
+        self.lock = threading.Lock()
+        self.total_appended = 0  # Sequence number of the next appended item
+        self.columns = {field: np.zeros(max_size, dtype=dtype) for field, dtype in METRIC_NUMERIC_FIELDS.items()}
+        self.labels = np.zeros(max_size, dtype=np.int32)
+        self.label_tuples = []  # Interned tuples of the METRIC_LABEL_FIELDS values
+        self.label_index = {}
+
+    def append(self, item):
+        labels = tuple(item[field] for field in METRIC_LABEL_FIELDS)
+        with self.lock:
+            label = self.label_index.get(labels)
+            if label is None:
+                label = self.label_index[labels] = len(self.label_tuples)
+                self.label_tuples.append(labels)
+            slot = self.total_appended % self.max_size
+            for field, column in self.columns.items():
+                column[slot] = item[field]
+            self.labels[slot] = label
+            self.total_appended += 1
+
+    def slots(self, number=None, since=None, start_time=None, end_time=None):
+        """Return the ring slots of the selected items, oldest first. Called with the lock held."""
+        first_sequence = max(self.total_appended - self.max_size, since or 0)
+        slots = np.arange(min(first_sequence, self.total_appended), self.total_appended) % self.max_size
+        if start_time is not None:
+            slots = slots[self.columns['wall_timestamp'][slots] >= start_time]
+        if end_time is not None:
+            slots = slots[self.columns['wall_timestamp'][slots] <= end_time]
+        if number is not None:
+            slots = slots[-number:]
+        return slots
+
+    def snapshot(self, number=None, since=None, start_time=None, end_time=None):
+        """
+        Return a consistent copy of the items and the cursor to pass as since on the next call.
+        since: only return the items appended from that cursor on (items already pushed out are skipped).
+        number: only return the most recent number items.
+        start_time, end_time: only return the items whose wall_timestamp (seconds since the epoch) is within [start_time, end_time].
+        """
+        with self.lock:
+            slots = self.slots(number=number, since=since, start_time=start_time, end_time=end_time)
+            values = {field: column[slots].tolist() for field, column in self.columns.items()}
+            labels = [self.label_tuples[label] for label in self.labels[slots].tolist()]
+            total_appended = self.total_appended
+        items = []
+        for index, label_values in enumerate(labels):
+            item = dict(zip(METRIC_LABEL_FIELDS, label_values))
+            item.update((field, values[field][index]) for field in METRIC_NUMERIC_FIELDS)
+            items.append(item)
+        return items, total_appended
+
+    def aggregate(self, number=None, start_time=None):
+        """Return the aggregate_metric_columns of the most recent number items, or of the items since start_time."""
+        with self.lock:
+            slots = self.slots(number=number, start_time=start_time)
+            columns = {field: self.columns[field][slots] for field in AGGREGATE_FIELDS}
+        return aggregate_metric_columns(columns)
+
+def aggregate_metric_columns(columns):
+    """
+    Return the count, and the mean, p50, p95 and p99 of every column of AGGREGATE_FIELDS (NumPy arrays of equal length).
+    Used in the aggregate metrics service.
+    """
+    count = len(columns[AGGREGATE_FIELDS[0]])
+    aggregates = {'count': count}
+    if count == 0:
+        return aggregates
+    for field in AGGREGATE_FIELDS:
+        p50, p95, p99 = np.percentile(columns[field], [50, 95, 99]).tolist()
+        aggregates[field] = {'mean': float(np.mean(columns[field])), 'p50': p50, 'p95': p95, 'p99': p99}
+    return aggregates
+
+class SQLiteMetricsList:
+    """
+    Persistent metrics list with the append, snapshot and aggregate methods of MetricsRing, backed by an SQLite table in WAL mode.
+    Every item is stored as a JSON row, with its sequence number (the cursor of snapshot) and its wall_timestamp
+    (indexed, for the time range queries of the metrics service). The sequence numbers continue across restarts.
+    Bounded on disk: the rows beyond max_size are deleted every prune_interval appends, and their pages are reused.
+    With synchronous=NORMAL in WAL mode, an append is one INSERT and a commit without an fsync; a power loss can only
+    lose the latest appends, never corrupt the table.
+    A single connection is shared by the server replicas and the metrics service, serialized with a lock.
+    Used in the metrics service, if METRICS_STORE_PATH is set.
+    """
+    def __init__(self, path, max_size):
+        self.max_size = max_size
+        self.prune_interval = max(1, max_size // 10)
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        self.connection.execute('PRAGMA journal_size_limit=%d' % (8 * 1024 * 1024))
+        self.connection.execute('CREATE TABLE IF NOT EXISTS metrics (sequence INTEGER PRIMARY KEY, wall_timestamp REAL NOT NULL, item TEXT NOT NULL)')
+        self.connection.execute('CREATE INDEX IF NOT EXISTS metrics_wall_timestamp ON metrics (wall_timestamp)')
+        self.connection.commit()
+        self.total_appended = self.connection.execute('SELECT COALESCE(MAX(sequence), 0) FROM metrics').fetchone()[0]
+        self.prune()
 
     def append(self, item):
-        super().append(item)
-        if len(self) > self.max_size:
-            self.pop(0)
+        with self.lock:
+            self.total_appended += 1
+            self.connection.execute('INSERT INTO metrics (sequence, wall_timestamp, item) VALUES (?, ?, ?)',
+                                    (self.total_appended, item['wall_timestamp'], json.dumps(item)))
+            if self.total_appended % self.prune_interval == 0:
+                self.connection.execute('DELETE FROM metrics WHERE sequence <= ?', (self.total_appended - self.max_size,))
+            self.connection.commit()
+
+    def prune(self):
+        """Delete the rows beyond max_size, e.g., after a restart with a smaller METRICS_STORE_SIZE."""
+        with self.lock:
+            self.connection.execute('DELETE FROM metrics WHERE sequence <= ?', (self.total_appended - self.max_size,))
+            self.connection.commit()
+
+    def snapshot(self, number=None, since=None, start_time=None, end_time=None):
+        """Same as MetricsRing.snapshot; the rows pushed out but not yet pruned are skipped too."""
+        conditions = ['sequence > ?']
+        with self.lock:
+            parameters = [max(since or 0, self.total_appended - self.max_size)]
+            if start_time is not None:
+                conditions.append('wall_timestamp >= ?')
+                parameters.append(start_time)
+            if end_time is not None:
+                conditions.append('wall_timestamp <= ?')
+                parameters.append(end_time)
+            query = 'SELECT item FROM metrics WHERE ' + ' AND '.join(conditions) + ' ORDER BY sequence DESC'
+            if number is not None:
+                query += ' LIMIT ?'
+                parameters.append(number)
+            rows = self.connection.execute(query, parameters).fetchall()
+            total_appended = self.total_appended
+        return [json.loads(row[0]) for row in reversed(rows)], total_appended
+
+    def aggregate(self, number=None, start_time=None):
+        """Same as MetricsRing.aggregate, from the rows of snapshot."""
+        items, _ = self.snapshot(number=number, start_time=start_time)
+        return aggregate_metric_columns({field: np.array([item[field] for item in items], dtype=np.float64) for field in AGGREGATE_FIELDS})
+
+_shared_metrics_list = None
+_shared_metrics_list_lock = threading.Lock()
+
+def shared_metrics_list(max_size, store_path='', store_size=None):
+    """
+    Return the process-wide metrics list, creating it on the first call: an SQLiteMetricsList of store_size items at
+    store_path if store_path is set, otherwise a MetricsRing of max_size items.
+    Every BaseServer instance (one per server replica) appends to the same list, so the metrics service sees the merged metrics.
+    Used in the metrics service.
+    """
+    global _shared_metrics_list
+    with _shared_metrics_list_lock:
+        if _shared_metrics_list is None:
+            if store_path:
+                _shared_metrics_list = SQLiteMetricsList(store_path, store_size or max_size)
+            else:
+                _shared_metrics_list = MetricsRing(max_size)
+        return _shared_metrics_list
+
+class ResultCache:
+    """
+    Content-addressed cache of inference results, keyed on a hash of the input (see content_key).
+    Bounded by number of entries and by bytes, with Least Recently Used (LRU) eviction, and optionally a
+    Time To Live (TTL) after which an entry is treated as a miss.
+    Thread-safe, so it can be shared by the request handlers and the worker threads of the server replicas.
+    """
+    def __init__(self, max_entries, max_bytes, ttl=0):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl  # Seconds, 0 means that entries never expire
+        self.entries = OrderedDict()  # key -> (value, size, insertion time), least recently used first
+        self.total_bytes = 0
+        self.lock = threading.Lock()
+        self.counters = {
+            'hits': 0,
+            'misses': 0,
+            'evictions': 0,
+            'expirations': 0
+        }
+
+    def get(self, key):
+        """Return the cached value of key, or None on a miss."""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and self.ttl > 0 and time.monotonic() - entry[2] > self.ttl:
+                self._remove(key)
+                self.counters['expirations'] += 1
+                entry = None
+            if entry is None:
+                self.counters['misses'] += 1
+                return None
+            self.entries.move_to_end(key)
+            self.counters['hits'] += 1
+            return entry[0]
+
+    def put(self, key, value, size):
+        """Cache value under key, accounting for size bytes, and evict the least recently used entries beyond the bounds."""
+        if size > self.max_bytes:
+            return
+        with self.lock:
+            if key in self.entries:
+                self._remove(key)
+            self.entries[key] = (value, size, time.monotonic())
+            self.total_bytes += size
+            while len(self.entries) > self.max_entries or self.total_bytes > self.max_bytes:
+                self._remove(next(iter(self.entries)))
+                self.counters['evictions'] += 1
+
+    def _remove(self, key):
+        _, size, _ = self.entries.pop(key)
+        self.total_bytes -= size
+
+    def stats(self):
+        """Return the hit/miss counters and the current occupancy of the cache."""
+        with self.lock:
+            stats = dict(self.counters)
+            stats['entries'] = len(self.entries)
+            stats['bytes'] = self.total_bytes
+        return stats
+
+_shared_result_cache = None
+_shared_result_cache_lock = threading.Lock()
+
+def shared_result_cache(max_entries, max_bytes, ttl):
+    """
+    Return the process-wide ResultCache, creating it on the first call.
+    Every BaseServer instance (one per server replica) uses the same cache.
+    """
+    global _shared_result_cache
+    with _shared_result_cache_lock:
+        if _shared_result_cache is None:
+            _shared_result_cache = ResultCache(max_entries, max_bytes, ttl)
+        return _shared_result_cache
+
+def content_key(namespace, data):
+    """
+    Return the ResultCache key of the bytes data: its SHA-256 digest, prefixed with a namespace
+    that separates, e.g., whole request payloads from the single images inside them, or the models that produced them.
+    """
+    return (namespace, hashlib.sha256(data).digest())
+
+# The inference stages timed by BaseServer, in order
+INFERENCE_STAGES = ('decode_input', 'create_and_preprocess', 'reshape_input', 'experiment',
+                    'reshape_output', 'postprocess', 'encode_output', 'full_inference')
+
+class LatencyHistogram:
+    """
+    Fixed-bucket latency histogram with log-linear buckets, in the style of HDR histograms.
+    Bucket bounds grow geometrically by 2**(1/sub_buckets) from min_value to max_value seconds, so memory is constant
+    and a percentile is reported with a relative error below 2**(1/sub_buckets) - 1 (4.4% for 16 sub-buckets).
+    Values above max_value are counted in an overflow bucket. Used in the stats service.
+    """
+    def __init__(self, min_value=1e-6, max_value=100.0, sub_buckets=16):
+        self.min_value = min_value
+        self.sub_buckets = sub_buckets
+        self.num_buckets = math.ceil(math.log2(max_value / min_value) * sub_buckets) + 1
+        self.counts = [0] * (self.num_buckets + 1)  # The last bucket is the overflow bucket
+        self.count = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = 0.0
+
+    def record(self, value):
+        """Count value, in seconds, in its bucket."""
+        if value <= self.min_value:
+            index = 0
+        else:
+            index = min(int(math.log2(value / self.min_value) * self.sub_buckets) + 1, self.num_buckets)
+        self.counts[index] += 1
+        self.count += 1
+        self.total += value
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+    def percentile(self, percent):
+        """Return the upper bound of the bucket holding the given percentile, capped to the maximum recorded value."""
+        rank = max(math.ceil(percent / 100 * self.count), 1)
+        cumulative = 0
+        for index, bucket_count in enumerate(self.counts):
+            cumulative += bucket_count
+            if cumulative >= rank:
+                return min(self.min_value * 2 ** (index / self.sub_buckets), self.max)
+        return self.max
+
+    def summary(self):
+        """Return the count and the mean, min, max and percentiles of the recorded values, in ms."""
+        if self.count == 0:
+            return {'count': 0}
+        summary = {
+            'count': self.count,
+            'mean': self.total / self.count * 1000,
+            'min': self.min * 1000,
+            'max': self.max * 1000
+        }
+        for percent in (50, 90, 95, 99, 99.9):
+            summary[f"p{percent:g}"] = self.percentile(percent) * 1000
+        return summary
+
+class StageHistograms:
+    """
+    One LatencyHistogram per server mode and inference stage, created on the first recorded value.
+    Thread-safe, so it can be shared by the worker threads of the server replicas. Used in the stats service.
+    """
+    def __init__(self):
+        self.histograms = {}  # (server mode, stage) -> LatencyHistogram
+        self.lock = threading.Lock()
+
+    def record(self, mode, timings):
+        """Record the stage timings (stage name -> seconds) of one inference call in the histograms of mode."""
+        with self.lock:
+            for stage, value in timings.items():
+                histogram = self.histograms.get((mode, stage))
+                if histogram is None:
+                    histogram = self.histograms[(mode, stage)] = LatencyHistogram()
+                histogram.record(value)
+
+    def summary(self):
+        """Return the summaries of all the histograms, grouped by server mode."""
+        with self.lock:
+            summary = {}
+            for (mode, stage), histogram in self.histograms.items():
+                summary.setdefault(mode, {})[stage] = histogram.summary()
+        return summary
+
+_shared_stage_histograms = None
+_shared_stage_histograms_lock = threading.Lock()
+
+def shared_stage_histograms():
+    """
+    Return the process-wide StageHistograms, creating it on the first call.
+    Every BaseServer instance (one per server replica) records to the same histograms.
+    """
+    global _shared_stage_histograms
+    with _shared_stage_histograms_lock:
+        if _shared_stage_histograms is None:
+            _shared_stage_histograms = StageHistograms()
+        return _shared_stage_histograms
+
+_autotune_results = {}
+_autotune_lock = threading.Lock()
+
+def shared_autotune(key, sweep):
+    """
+    Return the autotuning result of key (e.g., the tuned parameter and the model path), calling sweep() only for the first server.
+    The sweeps are serialized, so the server replicas do not measure concurrently on the same device.
+    """
+    with _autotune_lock:
+        if key not in _autotune_results:
+            _autotune_results[key] = sweep()
+        return _autotune_results[key]
+
+def available_cpus():
+    """
+    Return the number of CPUs available to the process: its CPU affinity, capped by the cgroup CPU quota
+    (cgroup v2 cpu.max, or cgroup v1 cpu.cfs_quota_us) of the container. At least 1.
+    """
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+    quota = None
+    try:
+        with open('/sys/fs/cgroup/cpu.max') as f:
+            limit, period = f.read().split()
+        if limit != 'max':
+            quota = int(limit) / int(period)
+    except (OSError, ValueError):
+        try:
+            with open('/sys/fs/cgroup/cpu/cpu.cfs_quota_us') as f:
+                limit = int(f.read())
+            with open('/sys/fs/cgroup/cpu/cpu.cfs_period_us') as f:
+                period = int(f.read())
+            if limit > 0:
+                quota = limit / period
+        except (OSError, ValueError):
+            pass
+    if quota is not None:
+        cpus = min(cpus, int(quota))
+    return max(1, cpus)
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler that enqueues the log records as they are, so the %-formatting of the message also runs on the
+    listener thread instead of the logging thread. Safe as long as the log arguments are not modified after the call.
+    """
+    def prepare(self, record):
+        return record
+
+def enable_async_logging(logger_names):
+    """
+    Replace the handlers of the given loggers with a DeferredQueueHandler, and emit their records on a
+    QueueListener thread with the original handlers, so disk and console I/O stay out of the measured timings.
+    Returns the started listeners, to be stopped (flushing the queued records) at exit.
+    """
+    listeners = []
+    for logger_name in logger_names:
+        logger = logging.getLogger(logger_name)
+        handlers = list(logger.handlers)
+        if not handlers:
+            continue
+        log_queue = queue.SimpleQueue()
+        for handler in handlers:
+            logger.removeHandler(handler)
+        logger.addHandler(DeferredQueueHandler(log_queue))
+        listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+        listener.start()
+        listeners.append(listener)
+    return listeners
+
+def process_start_time():
+    """
+    Return the start of the process on the time.perf_counter() clock, read from /proc on Linux (clock tick resolution).
+    Falls back to the current time (i.e., the import of utils) where /proc is not available.
+    """
+    try:
+        with open('/proc/self/stat') as f:
+            # The fields after the command name; the start time (field 22) is in clock ticks since boot
+            stat_fields = f.read().rsplit(')', 1)[1].split()
+        with open('/proc/uptime') as f:
+            uptime = float(f.read().split()[0])
+        elapsed = uptime - int(stat_fields[19]) / os.sysconf('SC_CLK_TCK')
+    except (OSError, ValueError, IndexError):
+        elapsed = 0.0
+    return time.perf_counter() - max(elapsed, 0.0)
+
+class StartupProfiler:
+    """
+    Startup phases of the process, in seconds, for the cold-start (time-to-ready) time of the container.
+    A phase is either a duration (record) or the time from the start of the process (mark), e.g.:
+    - 'startup_interpreter': start of the process until flask_server.py starts its imports.
+    - 'startup_import_flask' and 'startup_import_server': imports of Flask, and of the server modules with their
+      AI-framework runtimes.
+    - 'time_to_ready': start of the process until every server replica is initialized and warmed up.
+    - 'time_to_first_response': start of the process until the first inference response.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.process_start = process_start_time()
+        self.phases = OrderedDict()
+
+    def record(self, phase, start, end=None):
+        """Record the duration of a phase, from start to end (default now), on the time.perf_counter() clock."""
+        if end is None:
+            end = time.perf_counter()
+        with self.lock:
+            self.phases[phase] = end - start
+
+    def mark(self, phase, first=False):
+        """Record the time from the start of the process until now. With first, only the first call is recorded."""
+        if first and phase in self.phases:
+            return
+        now = time.perf_counter()
+        with self.lock:
+            if not (first and phase in self.phases):
+                self.phases[phase] = now - self.process_start
+
+    def timings(self):
+        """Return a copy of the recorded phases."""
+        with self.lock:
+            return dict(self.phases)
+
+_shared_startup_profiler = None
+_shared_startup_profiler_lock = threading.Lock()
+
+def shared_startup_profiler():
+    """Return the process-wide StartupProfiler, creating it on the first call."""
+    global _shared_startup_profiler
+    with _shared_startup_profiler_lock:
+        if _shared_startup_profiler is None:
+            _shared_startup_profiler = StartupProfiler()
+        return _shared_startup_profiler
 
 metric_dictionary = {
     # All the relevant fields of the metric dictionary. Used in the metrics service.
@@ -67,6 +576,8 @@ def create_redis():
     Returns a client for interactions with the RedisTimeSeries.
     Used in monitoring.
     """
+    # Imported only when metrics are sent, since redistimeseries (and redis) take a noticeable part of the startup time
+    from redistimeseries.client import Client
     rts = Client(
         host=os.getenv('REDIS_IP', '127.0.0.1'),
         port=int(os.getenv('REDIS_PORT', '6379'))
@@ -96,15 +607,466 @@ def fill_redis_verbose(aif_characteristics_dict, AIF_timestamp, inference_metric
     keys_metrics_tuples.append((f"{key}:batch_size", inference_metrics_dict['batch_size']))
     return keys_metrics_tuples
 
-def send_redis_verbose(rts, keys_metrics_tuples):
+def send_redis_verbose(rts, keys_metrics_tuples, timestamp=None):
     """
-    Send the provided metric data to RedisTimeSeries with the current timestamp.
+    Send the provided metric data to RedisTimeSeries with the given timestamp (ms since the epoch), by default the
+    current wall-clock time, so the series of different nodes line up.
     Used in monitoring.
     """
-    timestamp = int(time.perf_counter() * 1000)
+    if timestamp is None:
+        timestamp = int(time.time() * 1000)
     for key, metric in keys_metrics_tuples:
         rts.add(key, timestamp, metric)
 
+class RedisExporter:
+    """
+    Background exporter of the RedisTimeSeries metrics, off the inference path.
+    submit only timestamps the key-metric tuples of one inference and puts them in a bounded queue; when the queue is
+    full (e.g., during a Redis outage), the sample is dropped and counted instead of blocking the request.
+    The exporter thread coalesces the queued samples and flushes them when flush_size samples are queued or
+    flush_interval seconds after the first one, in one pipelined round trip: a TS.MADD for the known keys, and a TS.ADD
+    for the keys not created yet (TS.MADD does not create keys).
+    The client (and its connection pool) is reused across flushes. On an error, the client is recreated with an
+    exponential backoff, from backoff_initial up to backoff_max seconds, and the batch is retried.
+    Used in RedisMetricsExporter, if ASYNC_REDIS_EXPORT is set.
+    """
+    def __init__(self, connect, queue_size, flush_size, flush_interval, backoff_initial=0.5, backoff_max=30.0):
+        self.connect = connect
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.backoff_initial = backoff_initial
+        self.backoff_max = backoff_max
+        self.rts = None
+        self.created_keys = set()
+        self.lock = threading.Lock()
+        self.counters = {'submitted': 0, 'sent': 0, 'dropped_queue_full': 0, 'rejected_by_redis': 0,
+                         'flushes': 0, 'send_errors': 0, 'connects': 0}
+        self.last_error = None
+        self.thread = threading.Thread(target=self.run, name='RedisExporter', daemon=True)
+        self.thread.start()
+
+    def submit(self, keys_metrics_tuples, timestamp=None):
+        """
+        Enqueue the key-metric tuples of one inference (or one aggregation window), with the given timestamp
+        (ms since the epoch), by default the current wall-clock time. Returns False if the sample was dropped.
+        """
+        if timestamp is None:
+            timestamp = int(time.time() * 1000)
+        try:
+            self.queue.put_nowait((timestamp, keys_metrics_tuples))
+        except queue.Full:
+            with self.lock:
+                self.counters['dropped_queue_full'] += 1
+            return False
+        with self.lock:
+            self.counters['submitted'] += 1
+        return True
+
+    def run(self):
+        """Exporter thread: collect the samples of one flush, on the size or time trigger, and send them."""
+        while True:
+            batch = [self.queue.get()]
+            flush_deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.flush_size:
+                timeout = flush_deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(self.queue.get(timeout=timeout))
+                except queue.Empty:
+                    break
+            self.flush(batch)
+
+    def flush(self, batch):
+        """Send one batch of samples, reconnecting with an exponential backoff until it is sent."""
+        backoff = self.backoff_initial
+        while True:
+            try:
+                if self.rts is None:
+                    self.rts = self.connect()
+                    with self.lock:
+                        self.counters['connects'] += 1
+                rejected = self.send(batch)
+                with self.lock:
+                    self.counters['sent'] += len(batch)
+                    self.counters['rejected_by_redis'] += rejected
+                    self.counters['flushes'] += 1
+                return
+            except Exception as e:
+                self.rts = None
+                with self.lock:
+                    self.counters['send_errors'] += 1
+                    self.last_error = repr(e)
+                time.sleep(backoff)
+                backoff = min(backoff * 2, self.backoff_max)
+
+    def send(self, batch):
+        """Send one batch in a single pipelined round trip. Returns the number of values rejected by Redis."""
+        new_samples, known_samples = [], []
+        for timestamp, keys_metrics_tuples in batch:
+            for key, metric in keys_metrics_tuples:
+                (known_samples if key in self.created_keys else new_samples).append((key, timestamp, metric))
+        pipeline = self.rts.pipeline(transaction=False)
+        for key, timestamp, metric in new_samples:
+            pipeline.add(key, timestamp, metric)
+        if known_samples:
+            pipeline.madd(known_samples)
+        # Errors of single commands are returned as replies; only connection errors are raised (and retried)
+        replies = pipeline.execute(raise_on_error=False)
+        rejected = 0
+        for (key, _, _), reply in zip(new_samples, replies):
+            if isinstance(reply, Exception):
+                rejected += 1
+            else:
+                self.created_keys.add(key)
+        if known_samples:
+            madd_reply = replies[-1]
+            madd_rejected = len(known_samples) if isinstance(madd_reply, Exception) else sum(isinstance(reply, Exception) for reply in madd_reply)
+            if madd_rejected:
+                # E.g., the keys were lost by a Redis restart, so they are created again by TS.ADD on the next flush
+                self.created_keys.clear()
+            rejected += madd_rejected
+        return rejected
+
+    def stats(self):
+        """Return the exporter counters, the queued samples and the last error."""
+        with self.lock:
+            stats = dict(self.counters)
+            stats['last_error'] = self.last_error
+        stats['queued'] = self.queue.qsize()
+        return stats
+
+class WindowedAggregator:
+    """
+    Client-side pre-aggregation of the Redis metrics in wall-clock windows of window seconds, aligned to the epoch
+    so the windows of different nodes line up.
+    add records the key-metric tuples of one inference in the LatencyHistogram of each key in the current window
+    (count, sum, min, max and a percentile sketch with a relative error below 4.4%), in constant memory per key.
+    At the end of each window, the aggregator thread emits one sample set per key through emit(keys_metrics_tuples,
+    timestamp), timestamped with the start of the window (ms since the epoch):
+    the mean under the key itself, and {key}:count, :sum, :min, :max, :p50, :p95 and :p99.
+    Thread-safe, so it can be shared by the server replicas. Used in RedisMetricsExporter, if REDIS_AGGREGATE_WINDOW_S is set.
+    """
+    percentiles = (50, 95, 99)
+
+    def __init__(self, window, emit):
+        self.window = window
+        self.emit = emit
+        self.lock = threading.Lock()
+        self.windows = {}  # Window start (seconds since the epoch) -> {key: LatencyHistogram}
+        self.thread = threading.Thread(target=self.run, name='WindowedAggregator', daemon=True)
+        self.thread.start()
+
+    def add(self, keys_metrics_tuples):
+        """Record the key-metric tuples of one inference in the current window."""
+        with self.lock:
+            # The window is selected under the lock, so a window is never recorded to after it has been emitted
+            window_start = math.floor(time.time() / self.window) * self.window
+            histograms = self.windows.get(window_start)
+            if histograms is None:
+                histograms = self.windows[window_start] = {}
+            for key, metric in keys_metrics_tuples:
+                histogram = histograms.get(key)
+                if histogram is None:
+                    histogram = histograms[key] = LatencyHistogram(min_value=1e-3, max_value=1e9)
+                histogram.record(metric)
+
+    def run(self):
+        """Aggregator thread: emit the closed windows right after the end of each window."""
+        while True:
+            now = time.time()
+            time.sleep((math.floor(now / self.window) + 1) * self.window - now)
+            self.flush()
+
+    def flush(self):
+        """Emit the sample sets of the windows that have ended."""
+        with self.lock:
+            current_start = math.floor(time.time() / self.window) * self.window
+            closed = sorted((window_start, histograms) for window_start, histograms in self.windows.items() if window_start < current_start)
+            for window_start, _ in closed:
+                del self.windows[window_start]
+        for window_start, histograms in closed:
+            keys_metrics_tuples = []
+            for key, histogram in histograms.items():
+                keys_metrics_tuples.append((key, histogram.total / histogram.count))
+                keys_metrics_tuples.append((f"{key}:count", histogram.count))
+                keys_metrics_tuples.append((f"{key}:sum", histogram.total))
+                keys_metrics_tuples.append((f"{key}:min", histogram.min))
+                keys_metrics_tuples.append((f"{key}:max", histogram.max))
+                for percent in self.percentiles:
+                    keys_metrics_tuples.append((f"{key}:p{percent}", histogram.percentile(percent)))
+            self.emit(keys_metrics_tuples, int(window_start * 1000))
+
+class RedisMetricsExporter:
+    """
+    Metrics exporter to RedisTimeSeries: the six samples of every metric dictionary (fill_redis_verbose), sent directly
+    with one TS.ADD each, or through a RedisExporter (async_export), and optionally pre-aggregated by a
+    WindowedAggregator (aggregate_window seconds).
+    Used in monitoring, with the 'redis' metrics exporter (or SEND_METRICS).
+    """
+    name = 'redis'
+
+    def __init__(self, logger, async_export=False, queue_size=10000, flush_size=100, flush_interval=1.0, backoff_max=30.0,
+                 aggregate_window=0):
+        self.logger = logger
+        self.rts = None
+        self.exporter = None
+        self.aggregator = None
+        if async_export:
+            # Connects on the exporter thread
+            self.exporter = RedisExporter(create_redis, queue_size=queue_size, flush_size=flush_size,
+                                          flush_interval=flush_interval, backoff_max=backoff_max)
+        else:
+            self.rts = create_redis()
+        if aggregate_window > 0:
+            self.aggregator = WindowedAggregator(aggregate_window, emit=self.send)
+
+    def export(self, metric):
+        """Send (or record in the current window) the samples of one metric dictionary."""
+        keys_metrics_tuples = fill_redis_verbose(aif_characteristics_dict=metric, AIF_timestamp=metric['AIF_timestamp'],
+                                                 inference_metrics_dict=metric)
+        if self.aggregator is not None:
+            # Only recorded in the current window, the aggregator thread sends one sample set per window
+            self.aggregator.add(keys_metrics_tuples)
+        else:
+            self.send(keys_metrics_tuples)
+
+    def send(self, keys_metrics_tuples, timestamp=None):
+        """Send key-metric tuples, timestamped with timestamp (ms since the epoch, by default now)."""
+        if self.exporter is not None:
+            # Only an enqueue; the exporter thread counts the dropped and failed samples
+            self.exporter.submit(keys_metrics_tuples, timestamp=timestamp)
+            return
+        try:
+            send_redis_verbose(self.rts, keys_metrics_tuples, timestamp=timestamp)
+        except Exception as e:
+            self.logger.warning("Could not send data to Redis: %s", e)
+
+    def stats(self):
+        """Return the counters of the RedisExporter, if any."""
+        return self.exporter.stats() if self.exporter is not None else {}
+
+def write_buffers(fd, buffers):
+    """
+    Write all the buffers (bytes) to the file descriptor with gathered writes (os.writev), without joining them into
+    one copy. A partially written buffer is continued through a memoryview.
+    """
+    index = 0
+    while index < len(buffers):
+        chunk = buffers[index:index + 1024]  # IOV_MAX
+        written = os.writev(fd, chunk)
+        for buffer in chunk:
+            if written >= len(buffer):
+                written -= len(buffer)
+                index += 1
+            else:
+                buffers[index] = memoryview(buffer)[written:]
+                break
+
+class FileMetricsExporter:
+    """
+    Metrics exporter to a local JSON Lines ('jsonl') or CSV ('csv') file, for offline benchmark campaigns without Redis.
+    Every metric dictionary is encoded once into a line of bytes and buffered; the buffered lines are appended to the
+    file (opened with O_APPEND) with gathered writes (write_buffers), when buffer_bytes are buffered and every
+    flush_interval seconds from a background thread, so at most flush_interval seconds of metrics are lost on a kill.
+    The file is rotated by size, like logging.handlers.RotatingFileHandler: when it would exceed max_bytes, it is
+    renamed to path.1 (path.1 to path.2, ..., up to backup_count), and a new file is started (with a header for CSV).
+    Thread-safe, so it can be shared by the server replicas. Used with the 'file' metrics exporter.
+    """
+    name = 'file'
+
+    def __init__(self, path, file_format='jsonl', max_bytes=64 * 1024 * 1024, backup_count=5, buffer_bytes=64 * 1024, flush_interval=1.0):
+        assert file_format in ('jsonl', 'csv'), f"The metrics file format should be jsonl or csv, got {file_format}"
+        self.path = path
+        self.file_format = file_format
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.buffer_bytes = buffer_bytes
+        self.flush_interval = flush_interval
+        self.lock = threading.Lock()
+        self.buffers = []
+        self.buffered_bytes = 0
+        self.fields = None  # CSV columns, the fields of the first metric dictionary
+        self.csv_line = io.StringIO()
+        self.csv_writer = csv.writer(self.csv_line, lineterminator='\n')
+        self.counters = {'records': 0, 'bytes_written': 0, 'writes': 0, 'rotations': 0}
+        self.open_file()
+        self.thread = threading.Thread(target=self.run, name='FileMetricsExporter', daemon=True)
+        self.thread.start()
+        atexit.register(self.flush)
+
+    def open_file(self):
+        self.fd = os.open(self.path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+        self.file_size = os.fstat(self.fd).st_size
+
+    def encode_csv(self, values):
+        """Return one CSV line of values, as bytes. Called with the lock held."""
+        self.csv_line.seek(0)
+        self.csv_line.truncate()
+        self.csv_writer.writerow(values)
+        return self.csv_line.getvalue().encode()
+
+    def export(self, metric):
+        """Buffer one metric dictionary, and write the buffer if it is full."""
+        if self.file_format == 'jsonl':
+            line = (json.dumps(metric) + '\n').encode()
+        with self.lock:
+            if self.file_format == 'csv':
+                if self.fields is None:
+                    self.fields = list(metric)
+                line = self.encode_csv([metric.get(field) for field in self.fields])
+            self.buffers.append(line)
+            self.buffered_bytes += len(line)
+            self.counters['records'] += 1
+            if self.buffered_bytes >= self.buffer_bytes:
+                self.write()
+
+    def write(self):
+        """Append the buffered lines to the file, rotating it first if needed. Called with the lock held."""
+        if not self.buffers:
+            return
+        if self.file_size > 0 and self.file_size + self.buffered_bytes > self.max_bytes:
+            self.rotate()
+        if self.file_size == 0 and self.file_format == 'csv':
+            self.buffers.insert(0, self.encode_csv(self.fields))
+            self.buffered_bytes += len(self.buffers[0])
+        write_buffers(self.fd, self.buffers)
+        self.file_size += self.buffered_bytes
+        self.counters['bytes_written'] += self.buffered_bytes
+        self.counters['writes'] += 1
+        self.buffers = []
+        self.buffered_bytes = 0
+
+    def rotate(self):
+        """Shift the backups by one, and start a new file. Called with the lock held."""
+        os.close(self.fd)
+        if self.backup_count > 0:
+            for index in range(self.backup_count - 1, 0, -1):
+                if os.path.exists(f"{self.path}.{index}"):
+                    os.replace(f"{self.path}.{index}", f"{self.path}.{index + 1}")
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+        self.open_file()
+        self.counters['rotations'] += 1
+
+    def flush(self):
+        """Write the buffered lines."""
+        with self.lock:
+            self.write()
+
+    def run(self):
+        """Flusher thread: write the buffered lines every flush_interval seconds."""
+        while True:
+            time.sleep(self.flush_interval)
+            self.flush()
+
+    def stats(self):
+        """Return the path, the counters and the buffered bytes."""
+        with self.lock:
+            stats = dict(self.counters)
+            stats['buffered_bytes'] = self.buffered_bytes
+        stats['path'] = self.path
+        return stats
+
+class PrometheusMetricsExporter:
+    """
+    Metrics exporter for Prometheus scrapes: per AIF instance (the labels of label_fields), counts the
+    inferences and the items, keeps cumulative histograms of the processing, data preparation and execution latency
+    (in seconds), and gauges of the latest throughput and batch size. render returns them in the Prometheus text
+    exposition format, for the /metrics endpoint of flask_server.py.
+    Thread-safe, so it can be shared by the server replicas. Used with the 'prometheus' metrics exporter.
+    """
+    name = 'prometheus'
+    label_fields = ('app_name', 'network_name', 'network_type', 'device', 'focus', 'node_name')
+    latency_fields = ('processing_latency', 'data_preparation_latency', 'execution_latency')
+    buckets = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)  # Seconds
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.series = {}  # Label values -> counters, histograms and gauges
+        self.records = 0
+
+    def export(self, metric):
+        """Count one metric dictionary in the series of its labels."""
+        labels = tuple(str(metric[field]) for field in self.label_fields)
+        with self.lock:
+            series = self.series.get(labels)
+            if series is None:
+                series = self.series[labels] = {
+                    'inferences': 0,
+                    'items': 0,
+                    'histograms': {field: [0] * (len(self.buckets) + 1) for field in self.latency_fields},
+                    'sums': {field: 0.0 for field in self.latency_fields}
+                }
+            series['inferences'] += 1
+            series['items'] += metric['dataset_size']
+            for field in self.latency_fields:
+                value = metric[field] / 1000
+                series['histograms'][field][bisect.bisect_left(self.buckets, value)] += 1
+                series['sums'][field] += value
+            series['throughput'] = metric['throughput']
+            series['batch_size'] = metric['batch_size']
+            self.records += 1
+
+    @staticmethod
+    def format_labels(names, values):
+        escaped = (value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for value in values)
+        return ','.join(f'{name}="{value}"' for name, value in zip(names, escaped))
+
+    def render(self):
+        """Return the series in the Prometheus text exposition format (version 0.0.4)."""
+        with self.lock:
+            series = {labels: {'inferences': state['inferences'], 'items': state['items'], 'throughput': state['throughput'],
+                               'batch_size': state['batch_size'], 'sums': dict(state['sums']),
+                               'histograms': {field: list(counts) for field, counts in state['histograms'].items()}}
+                      for labels, state in self.series.items()}
+        lines = []
+        metrics = [('aif_inferences_total', 'counter', 'Inference calls.', 'inferences'),
+                   ('aif_items_total', 'counter', 'Items (dataset size) processed by the inference calls.', 'items'),
+                   ('aif_throughput_items_per_second', 'gauge', 'Throughput of the latest inference call.', 'throughput'),
+                   ('aif_batch_size', 'gauge', 'Batch size of the latest inference call.', 'batch_size')]
+        for metric_name, metric_type, help_text, key in metrics:
+            lines.append(f"# HELP {metric_name} {help_text}")
+            lines.append(f"# TYPE {metric_name} {metric_type}")
+            for labels, state in series.items():
+                lines.append(f"{metric_name}{{{self.format_labels(self.label_fields, labels)}}} {state[key]}")
+        for field in self.latency_fields:
+            metric_name = f"aif_{field}_seconds"
+            lines.append(f"# HELP {metric_name} {field.replace('_', ' ').capitalize()} of the inference calls.")
+            lines.append(f"# TYPE {metric_name} histogram")
+            for labels, state in series.items():
+                cumulative = 0
+                for bound, count in zip(self.buckets + (math.inf,), state['histograms'][field]):
+                    cumulative += count
+                    le = '+Inf' if bound == math.inf else repr(bound)
+                    lines.append(f"{metric_name}_bucket{{{self.format_labels(self.label_fields + ('le',), labels + (le,))}}} {cumulative}")
+                label_text = self.format_labels(self.label_fields, labels)
+                lines.append(f"{metric_name}_sum{{{label_text}}} {state['sums'][field]}")
+                lines.append(f"{metric_name}_count{{{label_text}}} {state['inferences']}")
+        return '\n'.join(lines) + '\n'
+
+    def stats(self):
+        """Return the number of exported metric dictionaries and series."""
+        with self.lock:
+            return {'records': self.records, 'series': len(self.series)}
+
+_shared_metrics_exporters = None
+_shared_metrics_exporters_lock = threading.Lock()
+
+def shared_metrics_exporters(create_exporters):
+    """
+    Return the process-wide list of metrics exporters, created on the first call by create_exporters().
+    Shared by all the server replicas, so they export to the same file, Redis exporter and Prometheus series.
+    Used in monitoring.
+    """
+    global _shared_metrics_exporters
+    with _shared_metrics_exporters_lock:
+        if _shared_metrics_exporters is None:
+            _shared_metrics_exporters = create_exporters()
+        return _shared_metrics_exporters
+
 def create_metric_dictionary(aif_characteristics_dict, AIF_timestamp, inference_metrics_dict):
     """
     Populate a metric dictionary with relevant data based on AI characteristics and inference metrics.
@@ -128,7 +1090,8 @@ def create_metric_dictionary(aif_characteristics_dict, AIF_timestamp, inference_
         'app_UID': app_UID,
         'instance_UID': f"{app_UID}:{AIF_timestamp}",
         'node_name': os.getenv('NODE_NAME', 'ai-at-edge-worker-01'),
-        'timestamp': int(time.perf_counter() * 1000)
+        'timestamp': int(time.perf_counter() * 1000),
+        'wall_timestamp': time.time()
     }
     return my_dict
 